@@ -0,0 +1,199 @@
+from collections import deque
+
+import numpy as np
+
+NUM_LABELS = 7
+
+
+class RunningStats:
+    # Totals updated per detection, so the dashboard never rescans history
+    def __init__(self, window_ms=60_000):
+        self.window_ms = window_ms
+        self.reset()
+
+    def reset(self):
+        self.counts = np.zeros(NUM_LABELS, dtype=np.int64)
+        self.conf_sum = 0.0
+        self._window = deque()
+        self.window_counts = np.zeros(NUM_LABELS, dtype=np.int64)
+        self.window_conf_sum = 0.0
+
+    def update(self, ts_ms, label, confidence):
+        self.counts[label] += 1
+        self.conf_sum += confidence
+        self._window.append((ts_ms, label, confidence))
+        self.window_counts[label] += 1
+        self.window_conf_sum += confidence
+        self.expire(ts_ms)
+
+    def extend(self, rows):
+        # Bulk version of update() for a HISTORY_DTYPE array in time order
+        if len(rows) == 0:
+            return
+        self.counts += np.bincount(rows["label"], minlength=NUM_LABELS)
+        self.conf_sum += float(rows["confidence"].sum(dtype=np.float64))
+        recent = rows[rows["ts_ms"] >= int(rows["ts_ms"][-1]) - self.window_ms]
+        for row in recent:
+            self._window.append((int(row["ts_ms"]), int(row["label"]), float(row["confidence"])))
+            self.window_counts[row["label"]] += 1
+            self.window_conf_sum += float(row["confidence"])
+        self.expire(int(rows["ts_ms"][-1]))
+
+    def load(self, counts, conf_sum, recent):
+        # Totals from stored aggregates (DetectionStore.label_totals), the rolling window from the
+        # newest rows only
+        self.reset()
+        self.extend(recent)
+        self.counts = np.array(counts, dtype=np.int64)
+        self.conf_sum = float(conf_sum)
+
+    def expire(self, now_ms):
+        # Drop rows that slid out of the rolling window
+        cutoff = now_ms - self.window_ms
+        while self._window and self._window[0][0] < cutoff:
+            _, label, confidence = self._window.popleft()
+            self.window_counts[label] -= 1
+            self.window_conf_sum -= confidence
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    @property
+    def mean_confidence(self):
+        return self.conf_sum / self.total if self.total else 0.0
+
+    @property
+    def top_label(self):
+        return int(self.counts.argmax())
+
+    @property
+    def window_total(self):
+        return int(self.window_counts.sum())
+
+    @property
+    def window_mean_confidence(self):
+        return self.window_conf_sum / self.window_total if self.window_total else 0.0
+
+    def snapshot(self):
+        return {
+            "counts": self.counts.copy(),
+            "mean_confidence": self.mean_confidence,
+            "window_total": self.window_total,
+            "window_mean_confidence": self.window_mean_confidence,
+        }
+
+
+class BucketSeries:
+    # Confidence over time as min/mean/max per bucket, never more than `budget` buckets.
+    # When time runs past the last bucket the width doubles and neighbouring buckets merge.
+    def __init__(self, budget=240, width_ms=1000):
+        self.budget = budget + budget % 2
+        self.base_width = width_ms
+        self.reset()
+
+    def reset(self):
+        self.width = self.base_width
+        self.origin = None
+        self.mins = np.full(self.budget, np.inf)
+        self.maxs = np.full(self.budget, -np.inf)
+        self.sums = np.zeros(self.budget)
+        self.counts = np.zeros(self.budget, dtype=np.int64)
+        self.labels = np.zeros((self.budget, NUM_LABELS), dtype=np.int64)
+
+    def _coarsen(self):
+        half = self.budget // 2
+        self.mins[:half] = np.minimum(self.mins[0::2], self.mins[1::2])
+        self.maxs[:half] = np.maximum(self.maxs[0::2], self.maxs[1::2])
+        self.sums[:half] = self.sums[0::2] + self.sums[1::2]
+        self.counts[:half] = self.counts[0::2] + self.counts[1::2]
+        self.labels[:half] = self.labels[0::2] + self.labels[1::2]
+        self.mins[half:] = np.inf
+        self.maxs[half:] = -np.inf
+        self.sums[half:] = 0.0
+        self.counts[half:] = 0
+        self.labels[half:] = 0
+        self.width *= 2
+
+    def update(self, ts_ms, label, confidence):
+        if self.origin is None:
+            self.origin = ts_ms - ts_ms % self.width
+        idx = max(0, (ts_ms - self.origin) // self.width)
+        while idx >= self.budget:
+            self._coarsen()
+            idx = (ts_ms - self.origin) // self.width
+        self.mins[idx] = min(self.mins[idx], confidence)
+        self.maxs[idx] = max(self.maxs[idx], confidence)
+        self.sums[idx] += confidence
+        self.counts[idx] += 1
+        self.labels[idx, label] += 1
+
+    def extend(self, rows):
+        # Bulk version of update() for a HISTORY_DTYPE array in time order
+        if len(rows) == 0:
+            return
+        ts = rows["ts_ms"].astype(np.int64)
+        if self.origin is None:
+            self.origin = int(ts[0]) - int(ts[0]) % self.width
+        while (int(ts[-1]) - self.origin) // self.width >= self.budget:
+            self._coarsen()
+        idx = np.maximum(0, (ts - self.origin) // self.width)
+        confidence = rows["confidence"].astype(np.float64)
+        np.minimum.at(self.mins, idx, confidence)
+        np.maximum.at(self.maxs, idx, confidence)
+        np.add.at(self.sums, idx, confidence)
+        np.add.at(self.counts, idx, 1)
+        np.add.at(self.labels, (idx, rows["label"]), 1)
+
+    def load(self, first_ms, last_ms, columns):
+        # Rebuilds the series from per-(bucket, label) aggregates. `columns(width_ms)` returns them
+        # as DetectionStore.bucket_columns does, for the width the span [first_ms, last_ms] needs.
+        self.reset()
+        while last_ms // self.width - first_ms // self.width >= self.budget:
+            self.width *= 2
+        bucket, label, count, mins, maxs, sums = columns(self.width)
+        if len(bucket) == 0:
+            return
+        self.origin = first_ms // self.width * self.width
+        idx = bucket - first_ms // self.width
+        np.minimum.at(self.mins, idx, mins)
+        np.maximum.at(self.maxs, idx, maxs)
+        np.add.at(self.sums, idx, sums)
+        np.add.at(self.counts, idx, count)
+        np.add.at(self.labels, (idx, label), count)
+
+    def buckets(self):
+        # Non-empty buckets as plain arrays: start ms, min, mean, max, count, dominant label
+        used = np.flatnonzero(self.counts)
+        return {
+            "ts_ms": self.origin + used * self.width if len(used) else used,
+            "min": self.mins[used],
+            "mean": self.sums[used] / self.counts[used],
+            "max": self.maxs[used],
+            "count": self.counts[used],
+            "label": self.labels[used].argmax(axis=1),
+        }
+
+
+def merge_buckets(bucket, label, count, mins, maxs, sums, width_ms):
+    # Fold per-(bucket, label) aggregates, e.g. from a SQL GROUP BY, into the BucketSeries.buckets() layout
+    keys, inv = np.unique(bucket, return_inverse=True)
+    n = len(keys)
+    out_min = np.full(n, np.inf)
+    out_max = np.full(n, -np.inf)
+    out_sum = np.zeros(n)
+    out_count = np.zeros(n, dtype=np.int64)
+    labels = np.zeros((n, NUM_LABELS), dtype=np.int64)
+    np.minimum.at(out_min, inv, mins)
+    np.maximum.at(out_max, inv, maxs)
+    np.add.at(out_sum, inv, sums)
+    np.add.at(out_count, inv, count)
+    np.add.at(labels, (inv, label), count)
+    return {
+        "ts_ms": keys * width_ms,
+        "min": out_min,
+        "mean": out_sum / np.maximum(out_count, 1),
+        "max": out_max,
+        "count": out_count,
+        "label": labels.argmax(axis=1),
+    }
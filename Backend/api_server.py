@@ -0,0 +1,193 @@
+"""Local HTTP/WebSocket API for emotion detection (Haar cascade + CNN).
+
+    python api_server.py --model ferNet.h5 --port 8080
+
+    curl --data-binary @face.jpg http://localhost:8080/predict
+    curl -F a=@one.jpg -F b=@two.jpg http://localhost:8080/predict/batch
+    curl --data-binary @class.jpg "http://localhost:8080/predict?crowd=1"
+
+ws://localhost:8080/ws takes binary JPEG frames and answers each one with a JSON
+message; send the next frame after the reply to keep latency low. GET /metrics
+serves per-stage timings in the Prometheus text format. ?crowd=1 on the predict
+endpoints switches to full-resolution, multi-core detection for group photos.
+"""
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from aiohttp import WSMsgType, web
+
+from backends import BACKENDS, DEFAULT_BACKEND, load_backend
+from batcher import DynamicBatcher
+from engine import LIVE_DETECT, UPLOAD_DETECT, decode_and_detect, load_labels, thread_face_detector
+from metrics import MetricsRegistry
+
+# WebSocket frames are searched at half resolution, like the live page; LIVE_DETECT is tuned for
+# that scale, so minSize is given here in full-resolution pixels
+STREAM_REDUCTION = 2
+STREAM_DETECT = dict(LIVE_DETECT, minSize=tuple(v * STREAM_REDUCTION for v in LIVE_DETECT["minSize"]))
+
+# ===============================
+# 1️⃣ Pipeline
+# ===============================
+def detect_faces(data, detect_kwargs, crowd=False, reduction=1):
+    # Runs on the worker pool: OpenCV releases the GIL, so decodes and detections overlap.
+    # Large images are searched at reduced resolution; boxes are always in full-resolution pixels.
+    boxes, batch, _, _ = decode_and_detect(data, thread_face_detector(), detect_kwargs, crowd=crowd,
+                                           min_reduction=reduction)
+    return boxes, batch
+
+
+class Service:
+    def __init__(self, model, labels, workers):
+        # The batcher merges faces from concurrent requests into shared forward passes
+        self.batcher = model
+        self.labels = labels
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="moodmirror-api")
+        self.started = time.time()
+        self.images = 0
+        self.metrics = MetricsRegistry()
+
+    async def analyze(self, data, detect_kwargs=UPLOAD_DETECT, crowd=False, reduction=1):
+        loop = asyncio.get_running_loop()
+        with self.metrics.timer("api.decode_detect"):
+            boxes, batch = await loop.run_in_executor(self.pool, detect_faces, data, detect_kwargs, crowd, reduction)
+        if boxes is None:
+            self.metrics.inc("api_unreadable_images")
+            return None
+        self.images += 1
+        if not boxes:
+            return []
+        with self.metrics.timer("api.classify"):
+            probs = await asyncio.wrap_future(self.batcher.submit(batch.faces))
+
+        faces = []
+        for box, prob in zip(boxes, probs):
+            emotion_index = int(np.argmax(prob))
+            faces.append({
+                "box": list(box),
+                "label": self.labels[emotion_index],
+                "confidence": round(float(prob[emotion_index]), 6),
+                "probs": [round(float(p), 6) for p in prob],
+            })
+        return faces
+
+    def close(self):
+        self.pool.shutdown()
+        self.batcher.close()
+
+
+# ===============================
+# 2️⃣ Handlers
+# ===============================
+def crowd_mode(request):
+    return request.query.get("crowd", "0").lower() in ("1", "true", "yes")
+
+
+async def predict(request):
+    service = request.app["service"]
+    faces = await service.analyze(await request.read(), crowd=crowd_mode(request))
+    if faces is None:
+        raise web.HTTPBadRequest(text="Body is not a decodable image")
+    return web.json_response({"faces": faces})
+
+
+async def predict_batch(request):
+    # multipart/form-data, one image per part; every image is analyzed concurrently
+    service = request.app["service"]
+    if not request.content_type.startswith("multipart/"):
+        raise web.HTTPBadRequest(text="Expected multipart/form-data with one image per part")
+
+    names, blobs = [], []
+    reader = await request.multipart()
+    async for part in reader:
+        names.append(part.filename or part.name)
+        blobs.append(await part.read())
+
+    crowd = crowd_mode(request)
+    results = await asyncio.gather(*(service.analyze(data, crowd=crowd) for data in blobs))
+    rows = []
+    for name, faces in zip(names, results):
+        row = {"name": name, "faces": faces or []}
+        if faces is None:
+            row["error"] = "unreadable"
+        rows.append(row)
+    return web.json_response({"results": rows})
+
+
+async def stream(request):
+    service = request.app["service"]
+    ws = web.WebSocketResponse(max_msg_size=request.app["max_upload"])
+    await ws.prepare(request)
+
+    index = 0
+    async for msg in ws:
+        if msg.type != WSMsgType.BINARY:
+            continue
+        faces = await service.analyze(msg.data, STREAM_DETECT, reduction=STREAM_REDUCTION)
+        reply = {"frame": index, "faces": faces or []}
+        if faces is None:
+            reply["error"] = "unreadable"
+        await ws.send_json(reply)
+        index += 1
+    return ws
+
+
+async def health(request):
+    service = request.app["service"]
+    return web.json_response({
+        "uptime_s": round(time.time() - service.started, 1),
+        "images": service.images,
+        "batcher": service.batcher.stats(),
+    })
+
+
+async def prometheus(request):
+    return web.Response(text=request.app["service"].metrics.prometheus(), content_type="text/plain")
+
+
+def create_app(service, max_upload):
+    app = web.Application(client_max_size=max_upload)
+    app["service"] = service
+    app["max_upload"] = max_upload
+    app.add_routes([
+        web.post("/predict", predict),
+        web.post("/predict/batch", predict_batch),
+        web.get("/ws", stream),
+        web.get("/health", health),
+        web.get("/metrics", prometheus),
+    ])
+
+    async def shutdown(app):
+        service.close()
+
+    app.on_cleanup.append(shutdown)
+    return app
+
+
+# ===============================
+# 3️⃣ Entry Point
+# ===============================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve emotion detection over HTTP and WebSocket.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--model", default="ferNet.h5")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, choices=BACKENDS)
+    parser.add_argument("--labels", default="class_labels.json")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Threads for decoding and detection")
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=4.0)
+    parser.add_argument("--max-upload-mb", type=float, default=20.0)
+    args = parser.parse_args(argv)
+
+    model = DynamicBatcher(load_backend(args.backend, args.model), args.max_batch, args.max_wait_ms)
+    service = Service(model, load_labels(args.labels), args.workers)
+    web.run_app(create_app(service, int(args.max_upload_mb * 1024 * 1024)), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+
+import numpy as np
+
+from engine import INPUT_SIZE, NUM_CLASSES, load_model
+
+# ===============================
+# Inference Backends
+# ===============================
+# Every backend is called like the Keras model, `model(batch, training=False)`, with raw
+# 0-255 pixels (uint8 or float), and returns a (N, 7) probability array.
+BACKENDS = ("keras", "tflite-float16", "tflite-int8", "onnx")
+
+DEFAULT_BACKEND = os.environ.get("MOODMIRROR_BACKEND", "keras")
+
+# Keras batches are padded up to one of these sizes so the compiled graph is traced once per bucket
+BUCKETS = (1, 2, 4, 8, 16)
+
+
+def artifact_path(weights_path, backend):
+    # fer2.h5 -> fer2_float16.tflite / fer2_int8.tflite / fer2.onnx, plus the fer2_savedmodel/ graph cache
+    stem = os.path.splitext(weights_path)[0]
+    if backend == "keras":
+        return weights_path
+    if backend == "savedmodel":
+        return f"{stem}_savedmodel"
+    if backend.startswith("tflite-"):
+        return f"{stem}_{backend.split('-', 1)[1]}.tflite"
+    if backend == "onnx":
+        return f"{stem}.onnx"
+    raise ValueError(f"Unknown backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+
+
+def _warm_up(model):
+    model(np.zeros((1, INPUT_SIZE, INPUT_SIZE, 1), dtype=np.float32), training=False)
+    return model
+
+
+def _cache_is_fresh(cache_dir, weights_path):
+    graph = os.path.join(cache_dir, "saved_model.pb")
+    return os.path.exists(graph) and os.path.getmtime(graph) >= os.path.getmtime(weights_path)
+
+
+def save_graph(model, cache_dir):
+    # Serialize the uint8 -> probabilities graph with a batch-polymorphic signature, so loading
+    # it later skips the Keras rebuild, the weight load and all tracing
+    import tensorflow as tf
+    module = tf.Module()
+    module.model = model
+    module.forward = tf.function(
+        lambda x: model(tf.cast(x, tf.float32), training=False),
+        input_signature=[tf.TensorSpec((None, INPUT_SIZE, INPUT_SIZE, 1), tf.uint8)]
+    )
+    # Several processes (batch_classify workers) may write the same cache at once: each one saves
+    # into its own temp dir and publishes it with a rename. Losing that race is fine, since the
+    # winner wrote the same graph.
+    parent, name = os.path.split(os.path.abspath(cache_dir))
+    tmp = tempfile.mkdtemp(dir=parent, prefix=f"{name}.tmp-")
+    stale = os.path.join(parent, f"{name}.stale-{uuid.uuid4().hex}")
+    try:
+        tf.saved_model.save(module, tmp)
+        try:
+            os.replace(tmp, cache_dir)
+        except OSError:
+            # A stale cache is in the way: move it aside, then try once more
+            try:
+                os.replace(cache_dir, stale)
+                os.replace(tmp, cache_dir)
+            except OSError:
+                pass
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+        shutil.rmtree(stale, ignore_errors=True)
+
+
+class KerasBackend:
+    name = "keras"
+
+    def __init__(self, path, buckets=BUCKETS, jit_compile=False, cache=True):
+        import tensorflow as tf
+        self.buckets = tuple(sorted(buckets))
+        self.pad = True
+        cache_dir = artifact_path(path, "savedmodel") if path and cache and not jit_compile else None
+
+        if cache_dir and _cache_is_fresh(cache_dir, path):
+            try:
+                self.graph = tf.saved_model.load(cache_dir)
+            except (OSError, tf.errors.OpError):
+                self.graph = None  # being replaced by another process right now; rebuild instead
+            if self.graph is not None:
+                # The cached graph takes any batch size without retracing, so batches go in unpadded
+                # (still chunked by the largest bucket)
+                self.forward = self.graph.forward
+                self.pad = False
+                _warm_up(self)
+                return
+
+        self.model = load_model(path)
+        # Raw uint8 pixels go straight in; the cast happens inside the graph
+        self.forward = tf.function(
+            lambda x: self.model(tf.cast(x, tf.float32), training=False), jit_compile=jit_compile
+        )
+
+        # Trace every bucket up front so no frame ever waits on a retrace
+        for bucket in self.buckets:
+            self.forward(np.zeros((bucket, INPUT_SIZE, INPUT_SIZE, 1), dtype=np.uint8))
+
+        if cache_dir:
+            try:
+                save_graph(self.model, cache_dir)
+            except (OSError, tf.errors.OpError):
+                pass  # read-only checkout or a failed write: keep working, just without the cache
+
+    def __call__(self, batch, training=False):
+        batch = np.asarray(batch, dtype=np.uint8)
+        largest = self.buckets[-1]
+        outputs = []
+        for start in range(0, len(batch), largest):
+            chunk = batch[start:start + largest]
+            n = len(chunk)
+            bucket = next(b for b in self.buckets if b >= n) if self.pad else n
+            if bucket != n:
+                padded = np.zeros((bucket, INPUT_SIZE, INPUT_SIZE, 1), dtype=np.uint8)
+                padded[:n] = chunk
+                chunk = padded
+            outputs.append(self.forward(chunk).numpy()[:n])
+
+        if not outputs:
+            return np.zeros((0, NUM_CLASSES), dtype=np.float32)
+        return outputs[0] if len(outputs) == 1 else np.concatenate(outputs)
+
+
+class TFLiteBackend:
+    def __init__(self, path, num_threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+        # XNNPACK is applied by default to float and int8 graphs on CPU
+        self.interpreter = Interpreter(model_path=path, num_threads=num_threads or os.cpu_count())
+        self.input_index = self.interpreter.get_input_details()[0]["index"]
+        self.output_index = self.interpreter.get_output_details()[0]["index"]
+        self.batch_size = None
+        # The interpreter owns mutable tensors, so calls from the WebRTC thread and the script are serialized
+        self.lock = threading.Lock()
+        self.name = "tflite-" + ("int8" if "int8" in os.path.basename(path) else "float16")
+        _warm_up(self)
+
+    def __call__(self, batch, training=False):
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        with self.lock:
+            if batch.shape[0] != self.batch_size:
+                self.interpreter.resize_tensor_input(self.input_index, batch.shape)
+                self.interpreter.allocate_tensors()
+                self.batch_size = batch.shape[0]
+            self.interpreter.set_tensor(self.input_index, batch)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self.output_index).copy()
+
+
+class OnnxBackend:
+    name = "onnx"
+
+    def __init__(self, path, num_threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        _warm_up(self)
+
+    def __call__(self, batch, training=False):
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+def load_backend(backend=DEFAULT_BACKEND, weights_path="fer2.h5", num_threads=None, jit_compile=False):
+    path = artifact_path(weights_path, backend)
+    if backend != "keras" and not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found; run `python export_model.py {weights_path}` first")
+
+    if backend == "keras":
+        return KerasBackend(path, jit_compile=jit_compile)
+    if backend.startswith("tflite-"):
+        return TFLiteBackend(path, num_threads)
+    return OnnxBackend(path, num_threads)
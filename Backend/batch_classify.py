@@ -0,0 +1,267 @@
+"""Headless batch emotion classification over a directory tree or a manifest of images.
+
+    python batch_classify.py photos/ -o results.jsonl --workers 8
+    python batch_classify.py manifest.txt -o results.csv --resume
+"""
+import argparse
+import csv
+import io
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import cv2
+import numpy as np
+
+from backends import BACKENDS, DEFAULT_BACKEND, load_backend
+from engine import (BACKEND_DETECT, BATCH_SIZE, CASCADE_PATH, FaceBatch, detect_and_crop, detect_preset, load_labels,
+                    load_presets, predict_in_batches, preset_kwargs)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+
+# ===============================
+# 1️⃣ Input Discovery
+# ===============================
+def walk_images(root):
+    # Lazy, sorted walk so a resumed run visits files in the same order
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        with os.scandir(current) as it:
+            entries = sorted(it, key=lambda e: e.name, reverse=True)
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                yield entry.path
+
+
+def read_manifest(path):
+    # One image path per line (or first CSV column); relative paths resolve against the manifest
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, "r", newline="") as f:
+        for row in csv.reader(f):
+            if not row or not row[0].strip() or row[0].startswith("#"):
+                continue
+            yield os.path.join(base, row[0].strip())
+
+
+def iter_inputs(source):
+    if os.path.isdir(source):
+        return walk_images(source)
+    return read_manifest(source)
+
+
+def chunked(paths, size, skip):
+    chunk = []
+    for path in paths:
+        if path in skip:
+            continue
+        chunk.append(path)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ===============================
+# 2️⃣ Worker Process
+# ===============================
+_worker = {}
+
+
+def _init_worker(backend, model_path, labels_path, detect_kwargs, batch_size, threads):
+    # Each worker pays for the model runtime and the cascade exactly once
+    cv2.setNumThreads(threads)
+    if backend == "keras":
+        import tensorflow as tf
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    _worker["model"] = load_backend(backend, model_path, num_threads=threads)
+    _worker["labels"] = load_labels(labels_path)
+    _worker["cascade"] = cv2.CascadeClassifier(CASCADE_PATH)
+    _worker["detect"] = detect_kwargs
+    _worker["batch_size"] = batch_size
+    _worker["faces"] = FaceBatch()
+
+
+def _classify_chunk(paths):
+    labels = _worker["labels"]
+    faces = _worker["faces"]
+    faces.clear()
+    rows, owners = [], []
+
+    for idx, path in enumerate(paths):
+        row = {"path": path, "faces": []}
+        gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            row["error"] = "unreadable"
+        else:
+            boxes, _ = detect_and_crop(_worker["cascade"], gray, _worker["detect"], faces)
+            owners.extend((idx, box) for box in boxes)
+        rows.append(row)
+
+    # All faces of the chunk go through the model together
+    probs = predict_in_batches(_worker["model"], faces.faces, _worker["batch_size"])
+    for (idx, box), prob in zip(owners, probs):
+        emotion_index = int(np.argmax(prob))
+        rows[idx]["faces"].append({
+            "box": list(box),
+            "label": labels[emotion_index],
+            "confidence": round(float(prob[emotion_index]), 6),
+            "probs": [round(float(p), 6) for p in prob],
+        })
+    return rows
+
+
+# ===============================
+# 3️⃣ Output Writers
+# ===============================
+class JsonlWriter:
+    def __init__(self, f, labels):
+        self.f = f
+
+    def write(self, rows):
+        self.f.write("".join(json.dumps(row) + "\n" for row in rows))
+        self.f.flush()
+
+    @staticmethod
+    def done_paths(f):
+        for line in f:
+            yield json.loads(line)["path"]
+
+
+class CsvWriter:
+    def __init__(self, f, labels):
+        self.f = f
+        self.prob_columns = [f"p_{labels[i]}" for i in sorted(labels)]
+        self.header = ["path", "face", "x", "y", "w", "h", "label", "confidence"] + self.prob_columns + ["error"]
+        if f.tell() == 0:
+            csv.writer(f).writerow(self.header)
+
+    def write(self, rows):
+        # One buffered write per chunk so an image's faces land together
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in rows:
+            if not row["faces"]:
+                writer.writerow([row["path"], -1] + [""] * (len(self.header) - 3) + [row.get("error", "")])
+            for i, face in enumerate(row["faces"]):
+                writer.writerow([row["path"], i] + face["box"] + [face["label"], face["confidence"]] + face["probs"] + [""])
+        self.f.write(buf.getvalue())
+        self.f.flush()
+
+    @staticmethod
+    def done_paths(f):
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            yield row[0]
+
+
+def load_resume_state(path, writer_cls):
+    # Drop a torn trailing line from an interrupted run, then collect finished images
+    if not os.path.exists(path):
+        return set()
+    with open(path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end != len(data):
+            f.truncate(end)
+    with open(path, "r", newline="") as f:
+        return set(writer_cls.done_paths(f))
+
+
+# ===============================
+# 4️⃣ Driver
+# ===============================
+def report(images, faces, started, final=False):
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(
+        f"{'Done' if final else 'Progress'}: {images} images, {faces} faces | "
+        f"{images / elapsed:.1f} images/sec, {faces / elapsed:.1f} faces/sec",
+        file=sys.stderr, flush=True
+    )
+
+
+def run(args):
+    writer_cls = CsvWriter if args.output.lower().endswith(".csv") else JsonlWriter
+    skip = load_resume_state(args.output, writer_cls) if args.resume else set()
+    if skip:
+        print(f"Resuming: {len(skip)} images already classified", file=sys.stderr)
+
+    if args.preset:
+        # Still images are searched at full resolution, so the preset's downscale doesn't apply
+        detect_kwargs = preset_kwargs(detect_preset(args.preset))
+    else:
+        detect_kwargs = dict(scaleFactor=args.scale_factor, minNeighbors=args.min_neighbors)
+        if args.min_size:
+            detect_kwargs["minSize"] = (args.min_size, args.min_size)
+
+    labels = load_labels(args.labels)
+    chunks = chunked(iter_inputs(args.source), args.chunk_size, skip)
+    images = faces = 0
+    started = last_report = time.perf_counter()
+
+    with open(args.output, "a" if args.resume else "w", newline="") as f, ProcessPoolExecutor(
+        max_workers=args.workers,
+        mp_context=mp.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(args.backend, args.model, args.labels, detect_kwargs, args.batch_size, args.threads),
+    ) as pool:
+        writer = writer_cls(f, labels)
+        # Keep a bounded window of chunks in flight so huge archives never sit in memory
+        pending = set()
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < args.workers * 2:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                else:
+                    pending.add(pool.submit(_classify_chunk, chunk))
+            if not pending:
+                break
+
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                rows = future.result()
+                writer.write(rows)
+                images += len(rows)
+                faces += sum(len(row["faces"]) for row in rows)
+
+            if time.perf_counter() - last_report >= args.report_every:
+                report(images, faces, started)
+                last_report = time.perf_counter()
+
+    report(images, faces, started, final=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify facial emotions for a directory or manifest of images.")
+    parser.add_argument("source", help="Image directory (walked recursively) or manifest file with one path per line")
+    parser.add_argument("-o", "--output", required=True, help="Results file; .csv writes one row per face, anything else JSONL")
+    parser.add_argument("--resume", action="store_true", help="Append to an existing output and skip images already in it")
+    parser.add_argument("--model", default="ferNet.h5")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, choices=BACKENDS)
+    parser.add_argument("--labels", default="class_labels.json")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, default=1, help="OpenCV/TensorFlow threads per worker")
+    parser.add_argument("--chunk-size", type=int, default=64, help="Images per task sent to a worker")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--scale-factor", type=float, default=BACKEND_DETECT["scaleFactor"])
+    parser.add_argument("--min-neighbors", type=int, default=BACKEND_DETECT["minNeighbors"])
+    parser.add_argument("--min-size", type=int, default=0)
+    parser.add_argument("--preset", choices=list(load_presets()),
+                        help="Haar preset from detect_sweep.py; overrides the three options above")
+    parser.add_argument("--report-every", type=float, default=10.0, help="Seconds between throughput reports")
+    run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from engine import NUM_CLASSES
+
+_STOP = object()
+
+
+class DynamicBatcher:
+    # Process-wide front for an inference backend. Concurrent callers (sessions, streams, threads)
+    # are merged into one forward pass of up to `max_batch` faces; a batch is sent once it is full
+    # or `max_wait_ms` after its oldest request arrived, and every caller gets back its own rows.
+    # Called exactly like the backend it wraps: `batcher(batch, training=False)`.
+    def __init__(self, model, max_batch=16, max_wait_ms=4.0, latency_window=4096):
+        self.model = model
+        self.name = getattr(model, "name", "keras")
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.requests = queue.SimpleQueue()
+
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=latency_window)
+        self.calls = 0
+        self.batches = 0
+        self.faces = 0
+
+        self.worker = threading.Thread(target=self._loop, name="moodmirror-batcher", daemon=True)
+        self.worker.start()
+
+    def __call__(self, batch, training=False):
+        if len(batch) == 0:
+            return np.zeros((0, NUM_CLASSES), dtype=np.float32)
+        return self.submit(batch).result()
+
+    def submit(self, batch):
+        # Copy: callers reuse their FaceBatch buffer as soon as they get a result
+        future = Future()
+        self.requests.put((np.array(batch, copy=True), future, time.perf_counter()))
+        return future
+
+    def close(self):
+        self.requests.put(_STOP)
+        self.worker.join()
+
+    # ---------- worker thread ----------
+    def _loop(self):
+        carry = None
+        while True:
+            item = carry if carry is not None else self.requests.get()
+            carry = None
+            if item is _STOP:
+                return
+
+            group, size = [item], len(item[0])
+            deadline = item[2] + self.max_wait
+            while size < self.max_batch:
+                try:
+                    item = self.requests.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                # A request that would overflow the batch (or a stop) starts the next round
+                if item is _STOP or size + len(item[0]) > self.max_batch:
+                    carry = item
+                    break
+                group.append(item)
+                size += len(item[0])
+            self._run(group, size)
+
+    def _run(self, group, size):
+        batch = group[0][0] if len(group) == 1 else np.concatenate([faces for faces, _, _ in group])
+        try:
+            predictions = self.model(batch, training=False)
+        except Exception as exc:
+            for _, future, _ in group:
+                future.set_exception(exc)
+            return
+
+        done = time.perf_counter()
+        offset = 0
+        for faces, future, submitted in group:
+            future.set_result(predictions[offset:offset + len(faces)])
+            offset += len(faces)
+        with self.lock:
+            self.calls += len(group)
+            self.batches += 1
+            self.faces += size
+            self.latencies.extend(done - submitted for _, _, submitted in group)
+
+    def stats(self):
+        with self.lock:
+            latencies = np.array(self.latencies) * 1000.0
+            return {
+                "requests": self.calls,
+                "forward_passes": self.batches,
+                "mean_batch": round(self.faces / self.batches, 2) if self.batches else 0.0,
+                "p50_ms": round(float(np.percentile(latencies, 50)), 2) if len(latencies) else 0.0,
+                "p99_ms": round(float(np.percentile(latencies, 99)), 2) if len(latencies) else 0.0,
+            }
@@ -0,0 +1,69 @@
+"""Throughput and tail latency of direct model calls vs. the shared DynamicBatcher
+as the number of concurrent streams grows.
+
+    python bench_batcher.py --model ferNet.h5 --streams 1 2 4 8 16 --duration 5
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from backends import BACKENDS, DEFAULT_BACKEND, load_backend
+from batcher import DynamicBatcher
+from engine import INPUT_SIZE
+
+
+def run_streams(model, streams, duration, max_faces):
+    # Each stream sends 1..max_faces faces per call, back to back, like a live session
+    latencies = [[] for _ in range(streams)]
+    faces_done = [0] * streams
+    stop = time.perf_counter() + duration
+
+    def stream(i):
+        rng = np.random.default_rng(i)
+        while time.perf_counter() < stop:
+            n = int(rng.integers(1, max_faces + 1))
+            batch = rng.integers(0, 256, (n, INPUT_SIZE, INPUT_SIZE, 1), dtype=np.uint8)
+            started = time.perf_counter()
+            model(batch, training=False)
+            latencies[i].append(time.perf_counter() - started)
+            faces_done[i] += n
+
+    threads = [threading.Thread(target=stream, args=(i,)) for i in range(streams)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    all_latencies = np.concatenate([np.array(l) for l in latencies]) * 1000.0
+    return sum(faces_done) / elapsed, np.percentile(all_latencies, 50), np.percentile(all_latencies, 99)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="ferNet.h5")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, choices=BACKENDS)
+    parser.add_argument("--streams", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per configuration")
+    parser.add_argument("--max-faces", type=int, default=3, help="Faces per request are drawn from 1..N")
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=4.0)
+    args = parser.parse_args(argv)
+
+    model = load_backend(args.backend, args.model)
+    batcher = DynamicBatcher(model, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+
+    print(f"{'streams':>8}{'mode':>10}{'faces/s':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    for streams in args.streams:
+        for mode, target in (("direct", model), ("batched", batcher)):
+            faces_per_s, p50, p99 = run_streams(target, streams, args.duration, args.max_faces)
+            print(f"{streams:>8}{mode:>10}{faces_per_s:>12.1f}{p50:>10.2f}{p99:>10.2f}")
+    print(f"batcher: {batcher.stats()}")
+    batcher.close()
+
+
+if __name__ == "__main__":
+    main()
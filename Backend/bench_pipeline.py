@@ -0,0 +1,253 @@
+"""Per-stage CPU benchmark of the live pipeline on synthetic frames with rendered faces.
+
+    python bench_pipeline.py -o baseline.json
+    python bench_pipeline.py -o candidate.json
+    python bench_pipeline.py --compare baseline.json candidate.json --threshold 0.1
+
+Stages: cvtColor, downscale, motion gate, detectMultiScale, crop/resize, model forward per batch
+size and overlay drawing, for every resolution x face count, plus crowd-mode detection
+against a single pass (wall and CPU time) on a 60-face group photo for each worker count. A random-weight model is
+used when the checkpoint is missing, which is fine for timing.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Benchmarks are CPU-only
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+
+import cv2
+import numpy as np
+
+from backends import BACKENDS, DEFAULT_BACKEND, KerasBackend, load_backend
+from engine import CASCADE_PATH, INPUT_SIZE, LIVE_DETECT, UPLOAD_DETECT, FaceBatch, detect_tiled
+from motion import MotionGate
+from overlay import draw_predictions
+
+RESOLUTIONS = {"480p": (854, 480), "720p": (1280, 720), "1080p": (1920, 1080)}
+
+
+# ===============================
+# 1️⃣ Synthetic Frames
+# ===============================
+def render_face(img, x, y, size):
+    # Flat cartoon face; enough structure (eyes, brows, nose, mouth) for the frontal Haar cascade
+    cx, cy = x + size // 2, y + size // 2
+    cv2.ellipse(img, (cx, cy), (int(size * 0.38), int(size * 0.5)), 0, 0, 360, (140, 160, 200), -1)
+    for side in (-1, 1):
+        ex, ey = cx + side * int(size * 0.16), cy - int(size * 0.1)
+        cv2.ellipse(img, (ex, ey), (int(size * 0.09), int(size * 0.05)), 0, 0, 360, (40, 40, 40), -1)
+        cv2.line(img, (ex - int(size * 0.1), ey - int(size * 0.1)), (ex + int(size * 0.1), ey - int(size * 0.1)),
+                 (50, 50, 60), max(1, size // 30))
+    cv2.line(img, (cx, cy - int(size * 0.05)), (cx, cy + int(size * 0.12)), (100, 120, 160), max(1, size // 40))
+    cv2.ellipse(img, (cx, cy + int(size * 0.25)), (int(size * 0.14), int(size * 0.05)), 0, 0, 360, (60, 60, 120), -1)
+    return (x, y, size, size)
+
+
+def synthetic_frame(width, height, faces, seed=0):
+    # Noisy background plus up to 10 faces on a 5x2 grid
+    rng = np.random.default_rng(seed)
+    img = rng.integers(70, 110, (height, width, 3), dtype=np.uint8)
+    size = height // 5
+    step_x, step_y = width // 5, height // 2
+    boxes = []
+    for i in range(faces):
+        col, row = i % 5, i // 5
+        x = col * step_x + (step_x - size) // 2
+        y = row * step_y + (step_y - size) // 2
+        boxes.append(render_face(img, x, y, size))
+    return cv2.GaussianBlur(img, (5, 5), 0), boxes
+
+
+def crowd_frame(width=3000, height=2000, rows=6, cols=10, seed=0):
+    # Group photo: a rows x cols grid of small faces
+    rng = np.random.default_rng(seed)
+    img = rng.integers(70, 110, (height, width, 3), dtype=np.uint8)
+    step_x, step_y = width // cols, height // rows
+    size = min(step_x, step_y) * 2 // 3
+    boxes = [render_face(img, c * step_x + (step_x - size) // 2, r * step_y + (step_y - size) // 2, size)
+             for r in range(rows) for c in range(cols)]
+    return cv2.GaussianBlur(img, (5, 5), 0), boxes
+
+
+# ===============================
+# 2️⃣ Timing
+# ===============================
+def timeit(fn, repeats, warmup=2):
+    for _ in range(warmup):
+        fn()
+    samples = np.empty(repeats)
+    cpu_started = time.process_time()
+    for i in range(repeats):
+        started = time.perf_counter()
+        fn()
+        samples[i] = (time.perf_counter() - started) * 1000.0
+    return {
+        "mean_ms": round(float(samples.mean()), 4),
+        "p50_ms": round(float(np.percentile(samples, 50)), 4),
+        "p95_ms": round(float(np.percentile(samples, 95)), 4),
+        # CPU time of the whole process (every thread) per call
+        "cpu_ms": round((time.process_time() - cpu_started) * 1000.0 / repeats, 4),
+        "repeats": repeats,
+    }
+
+
+def bench_frame(cascade, model, width, height, faces, args):
+    img, boxes = synthetic_frame(width, height, faces)
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (0, 0), fx=args.downscale, fy=args.downscale)
+    batch = FaceBatch(capacity=max(1, faces))
+    gate = MotionGate(max_static_ms=float("inf"))
+    gate.should_scan(small)
+
+    def crop():
+        batch.clear()
+        for box in boxes:
+            batch.add(gray, box)
+
+    crop()
+    predictions = [("Happy", 87.5, box) for box in boxes]
+    detected = cascade.detectMultiScale(small, **LIVE_DETECT)
+
+    stages = {
+        "cvtColor": timeit(lambda: cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), args.repeats),
+        "downscale": timeit(lambda: cv2.resize(gray, (0, 0), fx=args.downscale, fy=args.downscale), args.repeats),
+        # What a static frame costs instead of `detect` when the motion gate skips the cascade
+        "motion_gate": timeit(lambda: gate.should_scan(small), args.repeats),
+        "detect": timeit(lambda: cascade.detectMultiScale(small, **LIVE_DETECT), args.repeats),
+        "crop_resize": timeit(crop, args.repeats),
+        "overlay": timeit(lambda: draw_predictions(img.copy(), predictions), args.repeats),
+    }
+    if faces:
+        stages["forward"] = timeit(lambda: model(batch.faces, training=False), args.repeats)
+    return stages, len(detected)
+
+
+def run(args):
+    cascade = cv2.CascadeClassifier(CASCADE_PATH)
+    if os.path.exists(args.model):
+        model, weights = load_backend(args.backend, args.model), args.model
+    else:
+        model, weights = KerasBackend(None), "random"
+
+    results = {}
+    for name in args.resolutions:
+        width, height = RESOLUTIONS[name]
+        for faces in args.faces:
+            stages, detected = bench_frame(cascade, model, width, height, faces, args)
+            for stage, timing in stages.items():
+                results[f"{name}/{faces}f/{stage}"] = timing
+            print(f"{name:>6} {faces:>2} faces ({detected} detected): "
+                  + "  ".join(f"{stage} {t['p50_ms']:.2f}" for stage, t in stages.items()) + " ms", file=sys.stderr)
+
+    # Crowd mode: one whole-image pass (OpenCV's own threads) vs the same work split over N
+    # single-threaded workers, on the full photo and on the 2x-reduced decode uploads get
+    crowd, truth = crowd_frame()
+    full = cv2.cvtColor(crowd, cv2.COLOR_BGR2GRAY)
+    repeats = max(3, args.repeats // 10)
+    opencv_threads = cv2.getNumThreads()
+    for name, reduction in (("full", 1), ("half", 2)):
+        gray = cv2.resize(full, (0, 0), fx=1 / reduction, fy=1 / reduction, interpolation=cv2.INTER_AREA)
+        kwargs = dict(UPLOAD_DETECT, minSize=tuple(v // reduction for v in UPLOAD_DETECT["minSize"]))
+        cv2.setNumThreads(opencv_threads)
+        timing = timeit(lambda: cascade.detectMultiScale(gray, **kwargs), repeats, 1)
+        results[f"crowd/{name}/single/detect"] = timing
+        print(f"crowd {name} single pass: {timing['p50_ms']:.1f} ms, {timing['cpu_ms']:.1f} ms CPU", file=sys.stderr)
+        cv2.setNumThreads(1)
+        for workers in args.crowd_workers:
+            with ThreadPoolExecutor(workers) as pool:
+                found = detect_tiled(gray, kwargs, pool=pool, workers=workers)
+                timing = timeit(lambda: detect_tiled(gray, kwargs, pool=pool, workers=workers), repeats, 1)
+            results[f"crowd/{name}/{workers}w/detect"] = timing
+            print(f"crowd {name} {workers:>2} workers: {timing['p50_ms']:.1f} ms, {timing['cpu_ms']:.1f} ms CPU "
+                  f"({len(found)}/{len(truth)} faces)", file=sys.stderr)
+    cv2.setNumThreads(opencv_threads)
+
+    # Forward pass alone across batch sizes, independent of frame content
+    rng = np.random.default_rng(0)
+    for batch_size in args.batch_sizes:
+        faces = rng.integers(0, 256, (batch_size, INPUT_SIZE, INPUT_SIZE, 1), dtype=np.uint8)
+        timing = timeit(lambda: model(faces, training=False), args.repeats)
+        timing["per_face_ms"] = round(timing["p50_ms"] / batch_size, 4)
+        results[f"forward/batch{batch_size}"] = timing
+        print(f"forward batch {batch_size:>2}: {timing['p50_ms']:.2f} ms ({timing['per_face_ms']:.3f} ms/face)",
+              file=sys.stderr)
+
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "cpu_count": os.cpu_count(),
+            "opencv_threads": cv2.getNumThreads(),
+            "backend": getattr(model, "name", args.backend),
+            "weights": weights,
+            "downscale": args.downscale,
+        },
+        "results": results,
+    }
+
+
+# ===============================
+# 3️⃣ Compare
+# ===============================
+def compare(baseline_path, candidate_path, threshold):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    with open(candidate_path) as f:
+        candidate = json.load(f)["results"]
+
+    regressions = 0
+    print(f"{'stage':<28}{'base p50':>10}{'new p50':>10}{'change':>9}")
+    for key in sorted(baseline.keys() & candidate.keys()):
+        before, after = baseline[key]["p50_ms"], candidate[key]["p50_ms"]
+        change = (after - before) / before if before else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif change < -threshold:
+            flag = "  faster"
+        print(f"{key:<28}{before:>10.3f}{after:>10.3f}{change:>+9.1%}{flag}")
+
+    for key in sorted(baseline.keys() ^ candidate.keys()):
+        print(f"{key:<28} only in {'baseline' if key in baseline else 'candidate'}")
+    print(f"{regressions} regression(s) above {threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-o", "--output", help="Write results as JSON (stdout if omitted)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"), help="Compare two result files")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative p50 slowdown flagged as a regression")
+    parser.add_argument("--model", default="fer2.h5", help="Checkpoint; random weights are used if it is missing")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, choices=BACKENDS)
+    parser.add_argument("--resolutions", nargs="+", default=list(RESOLUTIONS), choices=list(RESOLUTIONS))
+    parser.add_argument("--faces", type=int, nargs="+", default=[0, 1, 3, 10])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--crowd-workers", type=int, nargs="+", default=sorted({1, 2, 4, os.cpu_count()}))
+    parser.add_argument("--downscale", type=float, default=0.5, help="Frame scale used for detection")
+    parser.add_argument("--repeats", type=int, default=30)
+    args = parser.parse_args(argv)
+    if any(not 0 <= n <= 10 for n in args.faces):
+        parser.error("--faces values must be between 0 and 10")
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.threshold))
+
+    report = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
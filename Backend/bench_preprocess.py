@@ -0,0 +1,100 @@
+"""Micro-benchmark: legacy per-face float preprocessing vs. the preallocated uint8 FaceBatch.
+
+    python bench_preprocess.py --faces 4 --iterations 2000
+"""
+import argparse
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from engine import INPUT_SIZE, FaceBatch
+
+
+def legacy_preprocess(gray, boxes):
+    # What app.py / emotion.py did per face before FaceBatch
+    face_imgs = []
+    for (x, y, w, h) in boxes:
+        face_img = gray[y:y+h, x:x+w]
+        face_img = cv2.resize(face_img, (INPUT_SIZE, INPUT_SIZE))
+        face_img = face_img.astype("float32") / 255.0
+        face_img = np.reshape(face_img, (INPUT_SIZE, INPUT_SIZE, 1))
+        face_imgs.append(face_img)
+    return np.array(face_imgs)
+
+
+def batch_preprocess(gray, boxes, batch):
+    batch.clear()
+    for box in boxes:
+        batch.add(gray, box)
+    return batch.faces
+
+
+# numpy registers its array buffers with tracemalloc under this domain
+NUMPY_DOMAIN = 389047
+
+
+def count_blocks(fn, calls, faces):
+    # Allocations left behind per face, from a snapshot diff around `calls` calls whose results are
+    # all kept alive: every traced block, and the numpy array buffers among them. Temporaries freed
+    # inside a call don't show up here; they are what the peak bytes column catches.
+    def count(snapshot, domain=None):
+        if domain is not None:
+            snapshot = snapshot.filter_traces([tracemalloc.DomainFilter(True, domain)])
+        return sum(stat.count for stat in snapshot.statistics("filename"))
+
+    results = []
+    before = tracemalloc.take_snapshot()
+    for _ in range(calls):
+        results.append(fn())
+    after = tracemalloc.take_snapshot()
+    blocks = count(after) - count(before)
+    buffers = count(after, NUMPY_DOMAIN) - count(before, NUMPY_DOMAIN)
+    return blocks / (calls * faces), buffers / (calls * faces)
+
+
+def measure(fn, iterations, faces, calls=100):
+    fn()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    us_per_face = (time.perf_counter() - started) * 1e6 / (iterations * faces)
+
+    tracemalloc.start()
+    # Traced heap growth inside one call: every temporary array shows up in the peak
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    blocks, buffers = count_blocks(fn, calls, faces)
+    tracemalloc.stop()
+    return us_per_face, (peak - before) / faces, blocks, buffers
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--faces", type=int, default=4)
+    parser.add_argument("--face-size", type=int, default=160, help="Side of each face crop in the 720p frame")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    gray = rng.integers(0, 256, (720, 1280), dtype=np.uint8)
+    step = args.face_size + 10
+    boxes = [((i * step) % (1280 - args.face_size), (i * step // 1280) * step, args.face_size, args.face_size)
+             for i in range(args.faces)]
+    batch = FaceBatch(capacity=args.faces)
+
+    rows = [
+        ("legacy float32", *measure(lambda: legacy_preprocess(gray, boxes), args.iterations, args.faces)),
+        ("FaceBatch uint8", *measure(lambda: batch_preprocess(gray, boxes, batch), args.iterations, args.faces)),
+    ]
+    print(f"{args.faces} faces of {args.face_size}px, {args.iterations} iterations")
+    print(f"{'path':<18}{'µs/face':>10}{'peak bytes allocated/face':>28}{'blocks kept/face':>18}{'array buffers/face':>20}")
+    for name, us, allocated, blocks, buffers in rows:
+        print(f"{name:<18}{us:>10.2f}{allocated:>28.0f}{blocks:>18.2f}{buffers:>20.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Cold-start benchmark: time from a fresh interpreter to the first prediction.
+
+    python bench_startup.py --model fer2.h5 --runs 3
+
+Every measurement runs in a new process, so import and load costs are never cached.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+MODES = {
+    "keras-rebuild": "Keras model rebuilt from the checkpoint and traced per bucket",
+    "keras-cached": "Serialized graph loaded from the <model>_savedmodel/ cache",
+    "tflite-float16": "TFLite float16 artifact from export_model.py",
+}
+
+
+def child(mode, model_path):
+    started = time.perf_counter()
+    import numpy as np
+    from backends import KerasBackend, load_backend
+    from engine import INPUT_SIZE
+    imported = time.perf_counter()
+
+    if mode == "keras-rebuild":
+        model = KerasBackend(model_path, cache=False)
+    elif mode == "keras-cached":
+        model = KerasBackend(model_path)
+    else:
+        model = load_backend(mode, model_path)
+    loaded = time.perf_counter()
+
+    model(np.zeros((1, INPUT_SIZE, INPUT_SIZE, 1), dtype=np.uint8), training=False)
+    done = time.perf_counter()
+    print(json.dumps({"import_s": imported - started, "load_s": loaded - imported,
+                      "predict_s": done - loaded, "total_s": done - started}))
+
+
+def measure(mode, model_path):
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", mode, "--model", model_path],
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="fer2.h5")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--child", choices=list(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        child(args.child, args.model)
+        return
+
+    from backends import artifact_path
+    if "keras-cached" in args.modes:
+        # Populate the graph cache once; this run is not timed
+        measure("keras-cached", args.model)
+    modes = [m for m in args.modes if m.startswith("keras") or os.path.exists(artifact_path(args.model, m))]
+
+    print(f"{'mode':<16}{'import s':>10}{'load s':>10}{'predict s':>11}{'total s':>10}")
+    for mode in modes:
+        runs = [measure(mode, args.model) for _ in range(args.runs)]
+        best = min(runs, key=lambda r: r["total_s"])
+        print(f"{mode:<16}{best['import_s']:>10.2f}{best['load_s']:>10.2f}{best['predict_s']:>11.3f}{best['total_s']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""Sweep Haar cascade settings for speed against recall/precision and emit named presets.
+
+    python detect_sweep.py --annotations faces.csv --write-presets
+    python detect_sweep.py --synthetic 40 -o sweep.json
+
+The annotations are a CSV with `path,x,y,w,h` rows (one per face; an image with no faces
+gets a row with empty coordinates) or a JSON object mapping each path to a list of
+[x, y, w, h] boxes. Paths are relative to the annotation file, and boxes are in
+full-resolution pixels. --synthetic renders cartoon faces instead, which is useful for
+timing but says little about recall on real photos.
+
+Each configuration (scaleFactor x minNeighbors x min face x downscale) is scored by
+detections matched at IoU >= 0.5. The presets are:
+  accurate: best F1
+  balanced: fastest within --balanced-tolerance of the best F1
+  fast:     fastest within --fast-tolerance of the best F1
+--write-presets stores them where engine.detect_preset() (app.py, emotion.py,
+batch_classify.py) picks them up.
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from engine import CASCADE_PATH, DETECT_PRESETS_PATH, preset_kwargs
+from tracker import iou
+
+
+# ===============================
+# 1️⃣ Labelled Faces
+# ===============================
+def load_annotations(path):
+    root = os.path.dirname(os.path.abspath(path))
+    boxes = {}
+    if path.endswith(".json"):
+        with open(path) as f:
+            for name, faces in json.load(f).items():
+                boxes[name] = [tuple(int(v) for v in face) for face in faces]
+    else:
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                faces = boxes.setdefault(row["path"], [])
+                if row.get("x"):
+                    faces.append(tuple(int(float(row[k])) for k in ("x", "y", "w", "h")))
+
+    samples = []
+    for name, faces in boxes.items():
+        gray = cv2.imread(os.path.join(root, name), cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            print(f"skipping unreadable {name}", file=sys.stderr)
+            continue
+        samples.append((gray, faces))
+    return samples
+
+
+def synthetic_samples(count, width=1280, height=720, seed=0):
+    # Non-overlapping cartoon faces of mixed sizes on noisy backgrounds
+    from bench_pipeline import render_face
+    rng = np.random.default_rng(seed)
+    samples = []
+    for _ in range(count):
+        img = rng.integers(70, 110, (height, width, 3), dtype=np.uint8)
+        faces = []
+        for _ in range(int(rng.integers(0, 6))):
+            size = int(rng.integers(24, 300))
+            x, y = int(rng.integers(0, width - size)), int(rng.integers(0, height - size))
+            if all(iou((x, y, size, size), box) == 0.0 for box in faces):
+                faces.append(render_face(img, x, y, size))
+        samples.append((cv2.cvtColor(cv2.GaussianBlur(img, (5, 5), 0), cv2.COLOR_BGR2GRAY), faces))
+    return samples
+
+
+# ===============================
+# 2️⃣ Scoring
+# ===============================
+def match(found, truth, threshold=0.5):
+    # Greedy one-to-one matching by IoU; returns the number of true positives
+    pairs = sorted(((iou(f, t), fi, ti) for fi, f in enumerate(found) for ti, t in enumerate(truth)), reverse=True)
+    used_found, used_truth = set(), set()
+    for overlap, fi, ti in pairs:
+        if overlap < threshold:
+            break
+        if fi not in used_found and ti not in used_truth:
+            used_found.add(fi)
+            used_truth.add(ti)
+    return len(used_found)
+
+
+def evaluate(cascade, samples, preset, repeats):
+    downscale = preset["downscale"]
+    kwargs = preset_kwargs(preset, downscale)
+    found_total = truth_total = hits = 0
+    best_s = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        detections = []
+        for gray, _ in samples:
+            small = gray if downscale == 1.0 else cv2.resize(gray, (0, 0), fx=downscale, fy=downscale,
+                                                             interpolation=cv2.INTER_AREA)
+            detections.append(cascade.detectMultiScale(small, **kwargs))
+        best_s = min(best_s, time.perf_counter() - started)
+
+    for (_, truth), faces in zip(samples, detections):
+        found = [tuple(v / downscale for v in box) for box in faces]
+        found_total += len(found)
+        truth_total += len(truth)
+        hits += match(found, truth)
+
+    recall = hits / truth_total if truth_total else 1.0
+    precision = hits / found_total if found_total else 1.0
+    f1 = 2 * recall * precision / (recall + precision) if recall + precision else 0.0
+    return {
+        **preset,
+        "recall": round(recall, 4),
+        "precision": round(precision, 4),
+        "f1": round(f1, 4),
+        "images_per_s": round(len(samples) / best_s, 2),
+        "ms_per_image": round(best_s * 1000.0 / len(samples), 3),
+    }
+
+
+def pareto(rows):
+    # Configurations no other one beats on both F1 and speed, fastest first
+    front = [r for r in rows if not any(
+        o["f1"] >= r["f1"] and o["images_per_s"] >= r["images_per_s"] and
+        (o["f1"] > r["f1"] or o["images_per_s"] > r["images_per_s"]) for o in rows)]
+    return sorted(front, key=lambda r: -r["images_per_s"])
+
+
+def pick_presets(rows, balanced_tolerance, fast_tolerance):
+    best = max(r["f1"] for r in rows)
+    fastest_within = lambda tol: max((r for r in rows if r["f1"] >= best * (1 - tol)), key=lambda r: r["images_per_s"])
+    chosen = {
+        "fast": fastest_within(fast_tolerance),
+        "balanced": fastest_within(balanced_tolerance),
+        "accurate": max(rows, key=lambda r: (r["f1"], r["images_per_s"])),
+    }
+    settings = ("scaleFactor", "minNeighbors", "min_face", "downscale")
+    presets = {name: {k: row[k] for k in settings} for name, row in chosen.items()}
+    measured = {name: {k: v for k, v in row.items() if k not in settings} for name, row in chosen.items()}
+    return presets, measured
+
+
+# ===============================
+# 3️⃣ Sweep
+# ===============================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--annotations", help="CSV or JSON of labelled face boxes")
+    source.add_argument("--synthetic", type=int, metavar="N", help="Use N synthetic frames instead")
+    parser.add_argument("--scale-factors", type=float, nargs="+", default=[1.05, 1.1, 1.2, 1.3])
+    parser.add_argument("--min-neighbors", type=int, nargs="+", default=[3, 4, 5, 6])
+    parser.add_argument("--min-faces", type=int, nargs="+", default=[30, 48, 60, 80],
+                        help="Smallest face searched for, in full-resolution pixels")
+    parser.add_argument("--downscales", type=float, nargs="+", default=[1.0, 0.75, 0.5, 0.25])
+    parser.add_argument("--repeats", type=int, default=2, help="Timing runs per configuration (best is kept)")
+    parser.add_argument("--balanced-tolerance", type=float, default=0.03)
+    parser.add_argument("--fast-tolerance", type=float, default=0.10)
+    parser.add_argument("-o", "--output", help="Write every configuration's scores as JSON")
+    parser.add_argument("--write-presets", nargs="?", const=DETECT_PRESETS_PATH, metavar="PATH",
+                        help=f"Store the presets (default {os.path.basename(DETECT_PRESETS_PATH)} next to engine.py)")
+    args = parser.parse_args(argv)
+
+    samples = load_annotations(args.annotations) if args.annotations else synthetic_samples(args.synthetic)
+    if not samples:
+        parser.error("no readable images")
+    print(f"{len(samples)} images, {sum(len(t) for _, t in samples)} faces", file=sys.stderr)
+
+    cascade = cv2.CascadeClassifier(CASCADE_PATH)
+    rows = []
+    for scale_factor, neighbors, min_face, downscale in itertools.product(
+            args.scale_factors, args.min_neighbors, args.min_faces, args.downscales):
+        preset = dict(scaleFactor=scale_factor, minNeighbors=neighbors, min_face=min_face, downscale=downscale)
+        rows.append(evaluate(cascade, samples, preset, args.repeats))
+        row = rows[-1]
+        print(f"sf {scale_factor:<5} mn {neighbors} min {min_face:>3} ds {downscale:<5} "
+              f"recall {row['recall']:.3f} precision {row['precision']:.3f} {row['images_per_s']:>8.1f} img/s",
+              file=sys.stderr)
+
+    print(f"\n{'scaleFactor':>11}{'minN':>6}{'minFace':>9}{'downscale':>11}{'recall':>9}{'precision':>11}{'F1':>7}{'img/s':>9}")
+    for r in pareto(rows):
+        print(f"{r['scaleFactor']:>11}{r['minNeighbors']:>6}{r['min_face']:>9}{r['downscale']:>11}"
+              f"{r['recall']:>9.3f}{r['precision']:>11.3f}{r['f1']:>7.3f}{r['images_per_s']:>9.1f}")
+
+    presets, measured = pick_presets(rows, args.balanced_tolerance, args.fast_tolerance)
+    print()
+    for name, preset in presets.items():
+        print(f"{name:<9} {preset}  F1 {measured[name]['f1']:.3f}  {measured[name]['images_per_s']:.1f} img/s")
+
+    meta = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "source": args.annotations or f"synthetic:{args.synthetic}",
+        "images": len(samples),
+        "platform": platform.platform(),
+        "opencv": cv2.__version__,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"meta": meta, "results": rows}, f, indent=2)
+    if args.write_presets:
+        with open(args.write_presets, "w") as f:
+            json.dump({"meta": meta, "presets": presets, "measured": measured}, f, indent=2)
+        print(f"presets written to {args.write_presets}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
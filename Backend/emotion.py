@@ -1,13 +1,16 @@
 import cv2
 import numpy as np
 import json
-import tensorflow as tf
 from collections import deque
 
+from backends import DEFAULT_BACKEND, load_backend
+from engine import BACKEND_DETECT, DETECT_PRESET, FaceBatch, detect_preset, preset_kwargs
+
 # ===============================
 # 1️⃣ Load Trained Model
 # ===============================
-model = tf.keras.models.load_model("ferNet.h5", compile=False)
+# MOODMIRROR_BACKEND selects keras, tflite-float16, tflite-int8 or onnx (see export_model.py)
+model = load_backend(DEFAULT_BACKEND, "ferNet.h5")
 
 # ===============================
 # 2️⃣ Load Emotion Labels
@@ -25,6 +28,16 @@ face_cascade = cv2.CascadeClassifier(
     cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
 )
 
+# MOODMIRROR_DETECT_PRESET=fast|balanced|accurate (see detect_sweep.py) sets the Haar settings
+# and the frame scale detection runs at; otherwise full frames with scaleFactor 1.3
+if DETECT_PRESET:
+    preset = detect_preset(DETECT_PRESET)
+    downscale = preset["downscale"]
+    detect_kwargs = preset_kwargs(preset, downscale)
+else:
+    downscale = 1.0
+    detect_kwargs = BACKEND_DETECT
+
 # ===============================
 # 4️⃣ Webcam Start
 # ===============================
@@ -39,6 +52,9 @@ print("🎥 Webcam Started - Press 'Q' to Exit")
 # For smoothing predictions
 emotion_window = deque(maxlen=10)
 
+# Preallocated face batch reused on every frame
+face_batch = FaceBatch(capacity=8)
+
 # ===============================
 # 5️⃣ Real-Time Loop
 # ===============================
@@ -49,28 +65,20 @@ while True:
 
     gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
 
-    faces = face_cascade.detectMultiScale(
-        gray,
-        scaleFactor=1.3,
-        minNeighbors=5
-    )
-
-    for (x, y, w, h) in faces:
-
-        # Crop face
-        face = gray[y:y+h, x:x+w]
-
-        # Resize to 48x48
-        face = cv2.resize(face, (48, 48))
+    small_gray = gray if downscale == 1.0 else cv2.resize(gray, (0, 0), fx=downscale, fy=downscale)
+    faces = [
+        (int(x / downscale), int(y / downscale), int(w / downscale), int(h / downscale))
+        for (x, y, w, h) in face_cascade.detectMultiScale(small_gray, **detect_kwargs)
+    ]
 
-        # Normalize
-        face = face.astype("float32") / 255.0
+    # Crop + resize every face straight into the reusable uint8 batch
+    face_batch.clear()
+    boxes = [(x, y, w, h) for (x, y, w, h) in faces if face_batch.add(gray, (x, y, w, h))]
 
-        # Reshape for CNN
-        face = np.reshape(face, (1, 48, 48, 1))
+    # Predict all faces in one call (normalization happens inside the model)
+    predictions = model(face_batch.faces, training=False) if boxes else []
 
-        # Predict
-        prediction = model.predict(face, verbose=0)
+    for (x, y, w, h), prediction in zip(boxes, predictions):
         emotion_index = np.argmax(prediction)
         confidence = np.max(prediction) * 100
 
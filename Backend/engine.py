@@ -0,0 +1,477 @@
+import io
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+# ===============================
+# Shared Inference Settings
+# ===============================
+INPUT_SIZE = 48
+NUM_CLASSES = 7
+BATCH_SIZE = 32
+
+CASCADE_PATH = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+
+# Haar settings used for still uploads
+UPLOAD_DETECT = dict(scaleFactor=1.1, minNeighbors=6, minSize=(80, 80))
+# Haar settings of the live page, applied to a downscaled frame
+LIVE_DETECT = dict(scaleFactor=1.1, minNeighbors=4, minSize=(30, 30))
+# Haar settings used by the standalone backend scripts
+BACKEND_DETECT = dict(scaleFactor=1.3, minNeighbors=5)
+
+# Uploads are searched for faces at no more than this long side; bigger images are decoded reduced
+DETECT_MAX_SIDE = 1280
+
+# Named Haar presets, measured by detect_sweep.py and stored next to this file. min_face is in
+# full-resolution pixels; downscale is the frame scale detection runs at where a caller rescales.
+DETECT_PRESETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "detect_presets.json")
+DEFAULT_DETECT_PRESETS = {
+    "fast": dict(scaleFactor=1.3, minNeighbors=5, min_face=60, downscale=0.5),
+    "balanced": dict(scaleFactor=1.1, minNeighbors=4, min_face=60, downscale=0.5),
+    "accurate": dict(scaleFactor=1.05, minNeighbors=5, min_face=48, downscale=1.0),
+}
+# Unset keeps the per-call-site settings above
+DETECT_PRESET = os.environ.get("MOODMIRROR_DETECT_PRESET")
+
+# Crowd mode splits the cascade's work into this many jobs per worker
+CROWD_JOBS_PER_WORKER = 4
+# Haar cascade window edge; the smallest face it can find
+HAAR_WINDOW = 24
+
+# ===============================
+# Detection Presets
+# ===============================
+def load_presets(path=DETECT_PRESETS_PATH):
+    # Built-in presets, overridden by whatever the last sweep wrote
+    presets = {name: dict(preset) for name, preset in DEFAULT_DETECT_PRESETS.items()}
+    try:
+        with open(path, "r") as f:
+            presets.update(json.load(f)["presets"])
+    except (OSError, ValueError, KeyError):
+        pass
+    return presets
+
+
+def detect_preset(name, path=DETECT_PRESETS_PATH):
+    presets = load_presets(path)
+    if name not in presets:
+        raise ValueError(f"Unknown detection preset {name!r}, expected one of {', '.join(presets)}")
+    return presets[name]
+
+
+def preset_kwargs(preset, scale=1.0):
+    # detectMultiScale arguments for an image already resized by `scale`
+    side = max(1, int(round(preset["min_face"] * scale)))
+    return dict(scaleFactor=preset["scaleFactor"], minNeighbors=preset["minNeighbors"], minSize=(side, side))
+
+
+# ===============================
+# Model
+# ===============================
+def build_model():
+    import tensorflow as tf
+    model = tf.keras.Sequential([
+        tf.keras.layers.Input(shape=(INPUT_SIZE, INPUT_SIZE, 1)),
+
+        tf.keras.layers.Conv2D(32, (3, 3), padding="same", activation="relu"),
+        tf.keras.layers.Conv2D(64, (3, 3), padding="same", activation="relu"),
+        tf.keras.layers.BatchNormalization(),
+        tf.keras.layers.MaxPooling2D(pool_size=(2, 2)),
+        tf.keras.layers.Dropout(0.25),
+
+        tf.keras.layers.Conv2D(
+            128, (3, 3),
+            padding="same",
+            activation="relu",
+            kernel_regularizer=tf.keras.regularizers.L2(0.01)
+        ),
+        tf.keras.layers.Conv2D(
+            256, (3, 3),
+            padding="valid",
+            activation="relu",
+            kernel_regularizer=tf.keras.regularizers.L2(0.01)
+        ),
+        tf.keras.layers.BatchNormalization(),
+        tf.keras.layers.MaxPooling2D(pool_size=(2, 2)),
+        tf.keras.layers.Dropout(0.25),
+
+        tf.keras.layers.Flatten(),
+        tf.keras.layers.Dense(1024, activation="relu"),
+        tf.keras.layers.Dropout(0.5),
+        tf.keras.layers.Dense(NUM_CLASSES, activation="softmax")
+    ])
+    model.build((None, INPUT_SIZE, INPUT_SIZE, 1))
+    return model
+
+
+def load_model(path="fer2.h5"):
+    import tensorflow as tf
+    if path is None:
+        # Randomly initialized, for benchmarks where no checkpoint is available
+        model = build_model()
+    else:
+        try:
+            # Full saved model (ferNet.h5 from the training notebook)
+            model = tf.keras.models.load_model(path, compile=False)
+        except ValueError:
+            # Weights-only checkpoint (fer2.h5) for the architecture above
+            model = build_model()
+            model.load_weights(path)
+
+    # The /255 normalization lives in the graph, so callers feed raw 0-255 pixels (uint8 is fine)
+    inputs = tf.keras.Input(shape=(INPUT_SIZE, INPUT_SIZE, 1))
+    outputs = model(tf.keras.layers.Rescaling(1.0 / 255)(inputs))
+    model = tf.keras.Model(inputs, outputs)
+
+    # Warm up so the first real call doesn't pay for graph setup
+    model(np.zeros((1, INPUT_SIZE, INPUT_SIZE, 1), dtype=np.float32), training=False)
+    return model
+
+
+def load_labels(path="class_labels.json"):
+    with open(path, "r") as f:
+        class_labels = json.load(f)
+    # Reverse mapping: index → emotion
+    return {v: k for k, v in class_labels.items()}
+
+
+# ===============================
+# Face Detection
+# ===============================
+_local = threading.local()
+
+
+def thread_face_detector():
+    # CascadeClassifier keeps per-call scratch state, so every thread gets its own copy
+    cascade = getattr(_local, "cascade", None)
+    if cascade is None:
+        cascade = cv2.CascadeClassifier(CASCADE_PATH)
+        _local.cascade = cascade
+    return cascade
+
+
+# ===============================
+# Preprocessing
+# ===============================
+class FaceBatch:
+    # Reusable uint8 (N, 48, 48, 1) batch; crops are resized straight into it with no float copies
+    def __init__(self, capacity=BATCH_SIZE):
+        self.buffer = np.zeros((capacity, INPUT_SIZE, INPUT_SIZE, 1), dtype=np.uint8)
+        self.count = 0
+
+    def clear(self):
+        self.count = 0
+
+    def add(self, gray, box):
+        x, y, w, h = box
+        face = gray[max(0, y):y+h, max(0, x):x+w]
+        if face.size == 0:
+            return False
+        if self.count == len(self.buffer):
+            grown = np.zeros((2 * len(self.buffer),) + self.buffer.shape[1:], dtype=np.uint8)
+            grown[:self.count] = self.buffer
+            self.buffer = grown
+        cv2.resize(face, (INPUT_SIZE, INPUT_SIZE), dst=self.buffer[self.count, :, :, 0])
+        self.count += 1
+        return True
+
+    @property
+    def faces(self):
+        return self.buffer[:self.count]
+
+
+def preprocess_face(gray, box):
+    # Single uint8 (48, 48, 1) crop; the model rescales to [0, 1] itself
+    x, y, w, h = box
+    face = gray[max(0, y):y+h, max(0, x):x+w]
+    if face.size == 0:
+        return None
+    face = cv2.resize(face, (INPUT_SIZE, INPUT_SIZE))
+    return face[:, :, None]
+
+
+# ===============================
+# Batched Inference
+# ===============================
+def predict_in_batches(model, faces, batch_size=BATCH_SIZE):
+    # Chunks of at most batch_size go in unpadded; shape bucketing is the backend's job
+    if len(faces) == 0:
+        return np.zeros((0, NUM_CLASSES), dtype=np.float32)
+
+    outputs = [np.asarray(model(faces[start:start + batch_size], training=False))
+               for start in range(0, len(faces), batch_size)]
+    return outputs[0] if len(outputs) == 1 else np.concatenate(outputs)
+
+
+def detect_and_crop(cascade, gray, detect_kwargs, batch=None):
+    # Crops land in `batch` (a FaceBatch); returns the boxes that produced a crop and the batch
+    faces = cascade.detectMultiScale(gray, **detect_kwargs)
+    if batch is None:
+        batch = FaceBatch(capacity=max(1, len(faces)))
+
+    boxes = []
+    for (x, y, w, h) in faces:
+        box = (int(x), int(y), int(w), int(h))
+        if batch.add(gray, box):
+            boxes.append(box)
+    return boxes, batch
+
+
+# ===============================
+# Crowd Detection
+# ===============================
+_tile_pool = None
+_tile_pool_lock = threading.Lock()
+
+
+def tile_pool():
+    # Shared by every crowd-mode call; one worker per core. OpenCV's thread count is process-wide,
+    # so creating the pool turns its internal parallel_for_ off for good: the jobs carry the
+    # parallelism, and each cascade call runs on one core instead of oversubscribing them.
+    global _tile_pool
+    with _tile_pool_lock:
+        if _tile_pool is None:
+            cv2.setNumThreads(1)
+            _tile_pool = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="moodmirror-tiles")
+        return _tile_pool
+
+
+def crowd_jobs(width, height, detect_kwargs, workers):
+    # Splits one detectMultiScale call into (min_side, max_side, y0, y1, pad) jobs. Consecutive
+    # pyramid levels are grouped into bands of about equal cost (pixels scanned), and each band is
+    # cut into horizontal strips, so every level is scanned exactly once, by one job, and no job is
+    # much bigger than 1 / (CROWD_JOBS_PER_WORKER * workers) of the whole. A strip owns the windows
+    # centred in its rows [y0, y1) and reads `pad` extra rows each side so those windows fit whole.
+    scale_factor = detect_kwargs.get("scaleFactor", 1.1)
+    min_side = min(detect_kwargs.get("minSize") or (0, 0))
+    max_side = min(detect_kwargs.get("maxSize") or (width, height))
+
+    levels = []
+    factor = 1.0
+    while round(width / factor) >= HAAR_WINDOW and round(height / factor) >= HAAR_WINDOW:
+        side = int(round(HAAR_WINDOW * factor))
+        if side > max_side:
+            break
+        if side >= min_side:
+            levels.append((side, width * height / (factor * factor)))
+        factor *= scale_factor
+    if not levels:
+        return []
+
+    target = sum(cost for _, cost in levels) / (CROWD_JOBS_PER_WORKER * max(1, workers))
+    bands, sides, cost = [], [], 0.0
+    for side, level_cost in levels:
+        sides.append(side)
+        cost += level_cost
+        if cost >= target:
+            bands.append((sides, cost))
+            sides, cost = [], 0.0
+    if sides:
+        bands.append((sides, cost))
+
+    jobs = []
+    for sides, cost in bands:
+        strips = max(1, min(int(round(cost / target)), height // (2 * sides[-1])))
+        rows = -(-height // strips)
+        jobs += [(sides[0], sides[-1], y, min(height, y + rows), sides[-1] // 2 + 1) for y in range(0, height, rows)]
+    return jobs
+
+
+def nms(boxes, iou=0.3):
+    # Greedy non-maximum suppression; Haar boxes carry no score, so bigger boxes win
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    x1, y1 = boxes[:, 0], boxes[:, 1]
+    x2, y2 = x1 + boxes[:, 2], y1 + boxes[:, 3]
+    area = boxes[:, 2] * boxes[:, 3]
+    order = np.argsort(-area, kind="stable")
+
+    keep = []
+    while order.size:
+        i, rest = order[0], order[1:]
+        keep.append(i)
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = w * h
+        order = rest[inter / (area[i] + area[rest] - inter) <= iou]
+    return [tuple(int(v) for v in boxes[i]) for i in keep]
+
+
+def detect_tiled(gray, detect_kwargs, pool=None, workers=None):
+    # Crowd mode: the work of one detectMultiScale call spread over a thread pool (OpenCV drops
+    # the GIL). Jobs return raw windows (minNeighbors=0) and the neighbour grouping runs once over
+    # all of them, as the single pass does, so the result and the total work match a single pass.
+    # With one worker there is nothing to gain, and the single pass runs instead.
+    workers = workers or os.cpu_count()
+    if workers <= 1:
+        return [tuple(int(v) for v in box) for box in thread_face_detector().detectMultiScale(gray, **detect_kwargs)]
+
+    height, width = gray.shape[:2]
+    pool = pool or tile_pool()
+
+    def run(job):
+        min_side, max_side, y0, y1, pad = job
+        top = max(0, y0 - pad)
+        raw = thread_face_detector().detectMultiScale(
+            gray[top:min(height, y1 + pad)],
+            **dict(detect_kwargs, minNeighbors=0, minSize=(min_side, min_side), maxSize=(max_side, max_side))
+        )
+        raw = np.asarray(raw, dtype=np.int32).reshape(-1, 4)
+        raw[:, 1] += top
+        centre = raw[:, 1] + raw[:, 3] // 2
+        return raw[(centre >= y0) & (centre < y1)]
+
+    found = list(pool.map(run, crowd_jobs(width, height, detect_kwargs, workers)))
+    if not found:
+        return []
+    raw = np.concatenate(found)
+    grouped, _ = cv2.groupRectangles(raw.tolist(), detect_kwargs.get("minNeighbors", 3), 0.2)
+    return [tuple(int(v) for v in box) for box in grouped]
+
+
+# ===============================
+# Upload Decoding
+# ===============================
+REDUCTIONS = (1, 2, 4, 8)
+_GRAY_FLAGS = {1: cv2.IMREAD_GRAYSCALE, 2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+               4: cv2.IMREAD_REDUCED_GRAYSCALE_4, 8: cv2.IMREAD_REDUCED_GRAYSCALE_8}
+_COLOR_FLAGS = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+                4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+
+def image_info(data):
+    # (width, height, EXIF orientation) from the header alone; no pixels are decoded
+    from PIL import Image
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            return img.width, img.height, img.getexif().get(0x0112, 1)
+    except Exception:
+        return None
+
+
+def apply_orientation(img, orientation):
+    # Turn a raw decode upright according to its EXIF orientation tag
+    if orientation == 2:
+        return cv2.flip(img, 1)
+    if orientation == 3:
+        return cv2.rotate(img, cv2.ROTATE_180)
+    if orientation == 4:
+        return cv2.flip(img, 0)
+    if orientation == 5:
+        return cv2.transpose(img)
+    if orientation == 6:
+        return cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
+    if orientation == 7:
+        return cv2.flip(cv2.transpose(img), -1)
+    if orientation == 8:
+        return cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    return img
+
+
+def _decode(buf, flag, orientation):
+    img = cv2.imdecode(buf, flag | cv2.IMREAD_IGNORE_ORIENTATION)
+    return None if img is None else apply_orientation(img, orientation)
+
+
+def decode_and_detect(data, cascade, detect_kwargs=UPLOAD_DETECT, batch=None, display_side=None,
+                      max_side=DETECT_MAX_SIDE, crowd=False, min_reduction=1):
+    # Multi-resolution path for uploads of any size:
+    #   * faces are searched on a grayscale decode reduced 2/4/8x so its long side is <= max_side
+    #   * crops come from the coarsest decode that still keeps every face >= 2x the model input
+    #     (full resolution for small faces), so detection shortcuts never cost crop detail
+    #   * the optional BGR `image` for display is decoded reduced to about `display_side`
+    #   * crowd=True ignores max_side, keeps the smallest face >= the 24 px Haar window instead,
+    #     and detects with detect_tiled
+    #   * min_reduction forces at least that much reduction, e.g. 2 for live frames
+    # Returns (boxes, batch, image, scale): boxes in upright full-resolution pixels, crops in `batch`,
+    # and scale = image pixels per full-resolution pixel. boxes is None when the data isn't an image.
+    if not data:
+        return None, None, None, 1.0
+    buf = np.frombuffer(data, dtype=np.uint8)  # zero-copy view of the upload
+    info = image_info(data)
+    if info is None:
+        # Unknown to Pillow: let OpenCV try a full-size decode
+        width = height = None
+        orientation = 1
+        reduction = 1
+    else:
+        width, height, orientation = info
+        if crowd:
+            min_face = min(detect_kwargs.get("minSize", (24, 24)))
+            reduction = max(r for r in REDUCTIONS if r == 1 or min_face / r >= 24)
+        else:
+            reduction = next((r for r in REDUCTIONS if max(width, height) / r <= max_side), REDUCTIONS[-1])
+        reduction = max(reduction, min_reduction)
+
+    small = _decode(buf, _GRAY_FLAGS[reduction], orientation)
+    if small is None:
+        return None, None, None, 1.0
+    if width is None:
+        height, width = small.shape
+    elif orientation in (5, 6, 7, 8):
+        width, height = height, width
+
+    # Detect on the reduced image with minSize scaled to match
+    kwargs = dict(detect_kwargs)
+    if "minSize" in kwargs:
+        kwargs["minSize"] = tuple(max(20, int(v / reduction)) for v in kwargs["minSize"])
+    found = detect_tiled(small, kwargs) if crowd else cascade.detectMultiScale(small, **kwargs)
+    fx, fy = width / small.shape[1], height / small.shape[0]
+    candidates = [(int(x * fx), int(y * fy), int(w * fx), int(h * fy)) for (x, y, w, h) in found]
+
+    if batch is None:
+        batch = FaceBatch(capacity=max(1, len(candidates)))
+    boxes = []
+    if candidates:
+        smallest = min(min(w, h) for (_, _, w, h) in candidates)
+        crop_reduction = max(r for r in REDUCTIONS if r <= reduction and (r == 1 or smallest / r >= 2 * INPUT_SIZE))
+        source = small if crop_reduction == reduction else _decode(buf, _GRAY_FLAGS[crop_reduction], orientation)
+        sx, sy = source.shape[1] / width, source.shape[0] / height
+        for box in candidates:
+            x, y, w, h = box
+            if batch.add(source, (int(x * sx), int(y * sy), max(1, int(w * sx)), max(1, int(h * sy)))):
+                boxes.append(box)
+
+    image, scale = None, 1.0
+    if display_side is not None:
+        display_reduction = max(r for r in REDUCTIONS if r == 1 or max(width, height) / r >= display_side)
+        image = _decode(buf, _COLOR_FLAGS[display_reduction], orientation)
+        if image is not None:
+            scale = image.shape[1] / width
+    return boxes, batch, image, scale
+
+
+def _decode_and_crop(data, detect_kwargs, display_side, crowd):
+    boxes, batch, image, scale = decode_and_detect(
+        data, thread_face_detector(), detect_kwargs, display_side=display_side or float("inf"), crowd=crowd
+    )
+    if boxes is None:
+        return None, [], None, 1.0
+    return image, boxes, batch.faces, scale
+
+
+def analyze_images(model, blobs, batch_size=BATCH_SIZE, workers=None, detect_kwargs=UPLOAD_DETECT, display_side=None,
+                   crowd=False):
+    # Decode, detect and crop every image concurrently (OpenCV releases the GIL),
+    # then classify all faces from all images in fixed-size batches.
+    # Boxes are in full-resolution pixels; "image" is decoded at about `display_side` (full size if None)
+    # and "scale" maps boxes onto it.
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        decoded = list(pool.map(lambda data: _decode_and_crop(data, detect_kwargs, display_side, crowd), blobs))
+
+    crops, owners = [], []
+    for idx, (_, boxes, faces, _) in enumerate(decoded):
+        if boxes:
+            crops.append(faces)
+            owners.extend((idx, box) for box in boxes)
+
+    faces = np.concatenate(crops) if crops else np.zeros((0, INPUT_SIZE, INPUT_SIZE, 1), dtype=np.uint8)
+    probs = predict_in_batches(model, faces, batch_size)
+
+    results = [{"image": image, "scale": scale, "faces": []} for image, _, _, scale in decoded]
+    for (idx, box), prob in zip(owners, probs):
+        results[idx]["faces"].append((box, prob))
+    return results
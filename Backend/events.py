@@ -0,0 +1,42 @@
+import numpy as np
+
+from history import HISTORY_DTYPE
+
+
+class EventChannel:
+    # Single-producer/single-consumer ring of detection records: the stream thread pushes, the
+    # script thread drains. Each side only writes its own counter, so neither ever takes a lock;
+    # a record becomes visible only after its slot is fully written. When the ring is full new
+    # records are dropped and counted rather than blocking the producer.
+    def __init__(self, capacity=1024):
+        self.rows = np.zeros(capacity, dtype=HISTORY_DTYPE)
+        self.head = 0  # advanced by the consumer
+        self.tail = 0  # advanced by the producer
+        self.dropped = 0
+
+    # ---------- producer ----------
+    def push(self, ts_ms, label, confidence, track=-1):
+        if self.tail - self.head >= len(self.rows):
+            self.dropped += 1
+            return False
+        self.rows[self.tail % len(self.rows)] = (ts_ms, label, confidence, track)
+        self.tail += 1
+        return True
+
+    # ---------- consumer ----------
+    def drain(self):
+        # Everything published so far, oldest first
+        head, tail = self.head, self.tail
+        if head == tail:
+            return self.rows[:0].copy()
+        capacity = len(self.rows)
+        start, end = head % capacity, tail % capacity
+        if start < end:
+            rows = self.rows[start:end].copy()
+        else:
+            rows = np.concatenate([self.rows[start:], self.rows[:end]])
+        self.head = tail
+        return rows
+
+    def __len__(self):
+        return self.tail - self.head
@@ -0,0 +1,146 @@
+"""Export the Keras emotion model to TFLite (float16 / int8) and ONNX, then check
+accuracy drift and latency of every backend against Keras.
+
+    python export_model.py fer2.h5 --calibration faces/ --formats tflite-float16 tflite-int8 onnx
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from backends import BACKENDS, artifact_path, load_backend
+from engine import BACKEND_DETECT, INPUT_SIZE, FaceBatch, detect_and_crop, load_model, thread_face_detector
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp"}
+
+# ===============================
+# 1️⃣ Calibration / Evaluation Faces
+# ===============================
+def load_faces(directory, limit):
+    # Face crops from a folder of images; images with no detectable face are used whole
+    faces = FaceBatch(capacity=limit)
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+            gray = cv2.imread(os.path.join(root, name), cv2.IMREAD_GRAYSCALE)
+            if gray is None:
+                continue
+            boxes, _ = detect_and_crop(thread_face_detector(), gray, BACKEND_DETECT, faces)
+            if not boxes:
+                faces.add(gray, (0, 0, gray.shape[1], gray.shape[0]))
+            if faces.count >= limit:
+                return faces.faces[:limit]
+    return faces.faces
+
+
+def synthetic_faces(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, (count, INPUT_SIZE, INPUT_SIZE, 1), dtype=np.uint8)
+
+
+# ===============================
+# 2️⃣ Export
+# ===============================
+def export_tflite(model, path, quantize, calibration):
+    import tensorflow as tf
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantize == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    else:
+        # Full-integer weights and activations; float32 in/out keeps it a drop-in replacement
+        def representative_dataset():
+            for face in calibration:
+                yield [face[None, ...].astype(np.float32)]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    with open(path, "wb") as f:
+        f.write(converter.convert())
+
+
+def export_onnx(model, path):
+    import tensorflow as tf
+    import tf2onnx
+    spec = (tf.TensorSpec((None, INPUT_SIZE, INPUT_SIZE, 1), tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=13, output_path=path)
+
+
+# ===============================
+# 3️⃣ Verification
+# ===============================
+def drift(reference, candidate):
+    agreement = float(np.mean(reference.argmax(axis=1) == candidate.argmax(axis=1)))
+    max_diff = float(np.abs(reference - candidate).max())
+    return agreement, max_diff
+
+
+def benchmark(model, faces, batch_sizes, repeats):
+    results = {}
+    for batch_size in batch_sizes:
+        batch = np.resize(faces, (batch_size, INPUT_SIZE, INPUT_SIZE, 1))
+        model(batch, training=False)
+        started = time.perf_counter()
+        for _ in range(repeats):
+            model(batch, training=False)
+        ms = (time.perf_counter() - started) * 1000.0 / repeats
+        results[batch_size] = (ms, batch_size * 1000.0 / ms)
+    return results
+
+
+def predict_all(model, faces):
+    return np.concatenate([np.asarray(model(faces[i:i+32], training=False)) for i in range(0, len(faces), 32)])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export and verify TFLite/ONNX inference backends.")
+    parser.add_argument("weights", nargs="?", default="fer2.h5")
+    parser.add_argument("--formats", nargs="+", default=["tflite-float16", "tflite-int8"],
+                        choices=[b for b in BACKENDS if b != "keras"])
+    parser.add_argument("--calibration", help="Folder of face images for int8 calibration and drift checks")
+    parser.add_argument("--samples", type=int, default=500)
+    parser.add_argument("--min-agreement", type=float, default=0.97,
+                        help="Minimum top-1 agreement with Keras before the run fails")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--skip-verify", action="store_true")
+    args = parser.parse_args(argv)
+
+    faces = load_faces(args.calibration, args.samples) if args.calibration else np.zeros((0,))
+    if len(faces) == 0:
+        print("⚠️ No calibration faces given; falling back to random inputs (int8 accuracy will suffer)", file=sys.stderr)
+        faces = synthetic_faces(args.samples)
+
+    model = load_model(args.weights)
+    for backend in args.formats:
+        path = artifact_path(args.weights, backend)
+        if backend == "onnx":
+            export_onnx(model, path)
+        else:
+            export_tflite(model, path, backend.split("-", 1)[1], faces)
+        print(f"✅ {backend}: {path} ({os.path.getsize(path) / 1e6:.2f} MB)")
+
+    if args.skip_verify:
+        return
+
+    reference = predict_all(load_backend("keras", args.weights), faces)
+    failed = False
+    print(f"\n{'backend':<16}{'top-1 agree':>12}{'max |Δp|':>10}" + "".join(f"{'bs' + str(b):>16}" for b in args.batch_sizes))
+    for backend in ["keras"] + args.formats:
+        model = load_backend(backend, args.weights)
+        agreement, max_diff = drift(reference, predict_all(model, faces))
+        timings = benchmark(model, faces, args.batch_sizes, args.repeats)
+        cells = "".join(f"{ms:>7.2f}ms {fps:>6.0f}/s" for ms, fps in timings.values())
+        print(f"{backend:<16}{agreement:>12.2%}{max_diff:>10.4f}{cells}")
+        failed |= agreement < args.min_agreement
+
+    if failed:
+        print(f"❌ Accuracy drift above threshold (agreement < {args.min_agreement:.0%})", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
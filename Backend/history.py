@@ -0,0 +1,158 @@
+import threading
+import time
+
+import numpy as np
+
+from aggregates import NUM_LABELS, BucketSeries, RunningStats
+
+# One row per recorded detection
+HISTORY_DTYPE = np.dtype([
+    ("ts_ms", "<i8"),       # epoch milliseconds
+    ("label", "u1"),        # emotion index (class_labels.json)
+    ("confidence", "<f4"),  # 0-100
+    ("track", "<i4"),       # tracker ID, -1 for still images
+])
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+class _Ring:
+    def __init__(self, capacity):
+        self.rows = np.zeros(capacity, dtype=HISTORY_DTYPE)
+        self.start = 0
+        self.size = 0
+
+    def push(self, row):
+        # Returns the row that fell off the end, if any
+        capacity = len(self.rows)
+        evicted = None
+        if self.size == capacity:
+            evicted = self.rows[self.start].copy()
+            self.start = (self.start + 1) % capacity
+            self.size -= 1
+        self.rows[(self.start + self.size) % capacity] = row
+        self.size += 1
+        return evicted
+
+    def ordered(self):
+        end = self.start + self.size
+        if end <= len(self.rows):
+            return self.rows[self.start:end].copy()
+        return np.concatenate([self.rows[self.start:], self.rows[:end - len(self.rows)]])
+
+    def clear(self):
+        self.start = 0
+        self.size = 0
+
+
+class DetectionHistory:
+    # Fixed-capacity history: the newest `recent` rows are kept as recorded, older rows are
+    # folded into one row per `bucket_ms` window, and the oldest buckets are dropped.
+    # Memory is constant no matter how long the session runs.
+    # With a `store` (DetectionStore) every append is also queued to the persistent log under `session`.
+    # `stats` and `series` are running aggregates for the dashboard, updated on every append.
+    def __init__(self, recent=3600, archive=2880, bucket_ms=10_000, store=None, session=None):
+        self.store = store
+        self.session = session
+        self.recent = _Ring(recent)
+        self.archive = _Ring(archive)
+        self.bucket_ms = bucket_ms
+        self.stats = RunningStats()
+        self.series = BucketSeries()
+        self.lock = threading.Lock()
+        self._reset_bucket()
+        if store is not None:
+            # A reloaded session picks its totals back up from the log, aggregated by SQLite
+            store.flush()
+            first, last = store.span(session)
+            if first is not None:
+                counts, conf_sum = store.label_totals(session)
+                self.stats.load(counts, conf_sum, store.query(session, start_ms=last - self.stats.window_ms))
+                self.series.load(first, last, lambda width: store.bucket_columns(session, width))
+
+    def _reset_bucket(self):
+        self._bucket_start = None
+        self._bucket_counts = np.zeros(NUM_LABELS, dtype=np.int64)
+        self._bucket_conf = 0.0
+        self._bucket_track = None
+
+    def _flush_bucket(self):
+        if self._bucket_start is None:
+            return
+        n = int(self._bucket_counts.sum())
+        row = (self._bucket_start, int(self._bucket_counts.argmax()), self._bucket_conf / n, self._bucket_track)
+        self.archive.push(row)
+        self._reset_bucket()
+
+    def _fold(self, row):
+        start = int(row["ts_ms"]) // self.bucket_ms * self.bucket_ms
+        if self._bucket_start is not None and start != self._bucket_start:
+            self._flush_bucket()
+        if self._bucket_start is None:
+            self._bucket_start = start
+            self._bucket_track = int(row["track"])
+        elif self._bucket_track != int(row["track"]):
+            self._bucket_track = -1
+        self._bucket_counts[row["label"]] += 1
+        self._bucket_conf += float(row["confidence"])
+
+    def append(self, label, confidence, track=-1, ts_ms=None):
+        row = (now_ms() if ts_ms is None else ts_ms, label, confidence, track)
+        with self.lock:
+            evicted = self.recent.push(row)
+            if evicted is not None:
+                self._fold(evicted)
+            self.stats.update(*row[:3])
+            self.series.update(*row[:3])
+        if self.store is not None:
+            self.store.record(self.session, *row)
+
+    def extend(self, rows):
+        # Bulk append of a HISTORY_DTYPE array under a single lock acquisition
+        if len(rows) == 0:
+            return
+        with self.lock:
+            for row in rows:
+                evicted = self.recent.push(row)
+                if evicted is not None:
+                    self._fold(evicted)
+            self.stats.extend(rows)
+            self.series.extend(rows)
+        if self.store is not None:
+            for row in rows.tolist():
+                self.store.record(self.session, *row)
+
+    def __len__(self):
+        with self.lock:
+            return self.recent.size + self.archive.size + (self._bucket_start is not None)
+
+    def snapshot(self):
+        # Everything in time order: downsampled buckets first, then recent rows
+        with self.lock:
+            parts = [self.archive.ordered()]
+            if self._bucket_start is not None:
+                n = int(self._bucket_counts.sum())
+                parts.append(np.array(
+                    [(self._bucket_start, int(self._bucket_counts.argmax()), self._bucket_conf / n, self._bucket_track)],
+                    dtype=HISTORY_DTYPE
+                ))
+            parts.append(self.recent.ordered())
+        return np.concatenate(parts)
+
+    def aggregates(self):
+        # Copies of the running aggregates, safe to render while appends continue
+        with self.lock:
+            self.stats.expire(now_ms())
+            return self.stats.snapshot(), self.series.buckets()
+
+    def clear(self):
+        with self.lock:
+            self.recent.clear()
+            self.archive.clear()
+            self._reset_bucket()
+            self.stats.reset()
+            self.series.reset()
+        if self.store is not None:
+            self.store.delete_session(self.session)
@@ -0,0 +1,191 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from engine import LIVE_DETECT, FaceBatch
+
+
+class Mailbox:
+    # Single-slot handoff: a new item replaces one that hasn't been picked up yet
+    def __init__(self, on_drop=None):
+        self._cond = threading.Condition()
+        self._item = None
+        self._closed = False
+        self.dropped = 0
+        self.on_drop = on_drop
+
+    def put(self, item):
+        with self._cond:
+            if self._item is not None:
+                self.dropped += 1
+                if self.on_drop is not None:
+                    self.on_drop()
+            self._item = item
+            self._cond.notify()
+
+    def get(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._item is not None or self._closed)
+            item, self._item = self._item, None
+            return item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class LivePipeline:
+    # Detection and classification run on their own threads so a video frame never waits on them:
+    #   transform --frame--> [detect thread] --boxes--> [classify thread]
+    # Both handoffs are latest-wins, so detection of frame N+1 overlaps classification of frame N.
+    # With `metrics` (a MetricsRegistry) stage timings and dropped handoffs are recorded under `session`.
+    # With `motion` (a MotionGate) the cascade is skipped on static frames and the last boxes reused;
+    # with `crop_gate` (a CropGate) faces whose crop hasn't changed keep their last probabilities;
+    # with `roi` (a RoiSearch) most scans only cover the neighbourhood of the last known faces.
+    def __init__(self, model, face_cascade, emotion_dict, scheduler, tracker, on_primary=None, detect_kwargs=LIVE_DETECT,
+                 metrics=None, session=None, motion=None, crop_gate=None, roi=None):
+        self.model = model
+        self.face_cascade = face_cascade
+        self.emotion_dict = emotion_dict
+        self.scheduler = scheduler
+        self.tracker = tracker
+        self.on_primary = on_primary
+        self.detect_kwargs = dict(detect_kwargs)
+        self.metrics = metrics
+        self.session = session
+        self.motion = motion
+        self.crop_gate = crop_gate
+        self.roi = roi
+        self.last_boxes = []
+
+        # Guards the tracker, which all three threads touch
+        self.lock = threading.Lock()
+        self.frames = Mailbox(on_drop=self._dropped("live_frames_dropped"))
+        self.detections = Mailbox(on_drop=self._dropped("live_detections_dropped"))
+        # Reused by the classification thread for every frame
+        self.faces = FaceBatch(capacity=8)
+        self.running = True
+        self.threads = [
+            threading.Thread(target=self._detect_loop, name="moodmirror-detect", daemon=True),
+            threading.Thread(target=self._classify_loop, name="moodmirror-classify", daemon=True),
+        ]
+        for t in self.threads:
+            t.start()
+
+    def _dropped(self, name):
+        if self.metrics is None:
+            return None
+        return lambda: self.metrics.inc(name, session=self.session)
+
+    def _observe(self, stage, ms):
+        if self.metrics is not None:
+            self.metrics.observe(stage, ms, self.session)
+
+    # ---------- frame thread ----------
+    def submit(self, img):
+        # Hand a copy to the detector when the scheduler asks for one; otherwise just move the boxes
+        if self.scheduler.should_detect():
+            self.frames.put(img.copy())
+        with self.lock:
+            self.tracker.predict(img)
+
+    def predictions(self):
+        with self.lock:
+            return [
+                (self.emotion_dict[t.emotion_index], t.confidence, t.box)
+                for t in self.tracker.tracks if t.emotion_index is not None
+            ]
+
+    def stats(self):
+        stats = {**self.scheduler.settings(), "dropped_frames": self.frames.dropped + self.detections.dropped}
+        if self.motion is not None:
+            stats.update(self.motion.stats())
+        if self.crop_gate is not None:
+            stats.update(self.crop_gate.stats())
+        if self.roi is not None:
+            stats.update(self.roi.stats())
+        return stats
+
+    def close(self):
+        self.running = False
+        self.frames.close()
+        self.detections.close()
+
+    # ---------- worker threads ----------
+    def _detect_loop(self):
+        while self.running:
+            img = self.frames.get()
+            if img is None:
+                return
+            start = time.perf_counter()
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            # Downscale for much faster face detection
+            scale = self.scheduler.scale
+            small_gray = cv2.resize(gray, (0, 0), fx=scale, fy=scale)
+            scan = self.motion is None or self.motion.should_scan(small_gray)
+            if scan:
+                kwargs = {**self.detect_kwargs, "minSize": self.scheduler.min_size}
+                if self.roi is None:
+                    faces = self.face_cascade.detectMultiScale(small_gray, **kwargs)
+                else:
+                    previous = [tuple(int(v * scale) for v in box) for box in self.last_boxes]
+                    faces = self.roi.detect(self.face_cascade, small_gray, previous, kwargs)
+                    if self.metrics is not None:
+                        self.metrics.inc("live_pixels_scanned", self.roi.pixels, self.session)
+                        self.metrics.inc("live_frame_pixels", self.roi.frame_pixels, self.session)
+                # Scale matching back to original size
+                boxes = [(int(x / scale), int(y / scale), int(w / scale), int(h / scale)) for (x, y, w, h) in faces]
+                self.last_boxes = boxes
+            else:
+                # Static scene: the previous boxes still hold
+                boxes = self.last_boxes
+            with self.lock:
+                tracks = self.tracker.update(img, boxes)
+            detect_ms = (time.perf_counter() - start) * 1000.0
+            if scan:
+                # The scheduler budgets for real scans only
+                self.scheduler.record_detection(detect_ms)
+                self._observe("live.detect", detect_ms)
+            else:
+                self._observe("live.detect_skipped", detect_ms)
+                if self.metrics is not None:
+                    self.metrics.inc("live_detect_skipped", session=self.session)
+
+            # New faces are always classified; known faces follow the scheduler's rate
+            if self.scheduler.should_classify() or any(t.emotion_index is None for t in tracks):
+                self.detections.put((gray, boxes, tracks))
+
+    def _classify_loop(self):
+        while self.running:
+            item = self.detections.get()
+            if item is None:
+                return
+            start = time.perf_counter()
+            gray, boxes, tracks = item
+
+            self.faces.clear()
+            face_tracks = [track for box, track in zip(boxes, tracks) if self.faces.add(gray, box)]
+            if not face_tracks:
+                continue
+
+            if self.crop_gate is None:
+                predictions = self.model(self.faces.faces, training=False)
+            else:
+                reused = self.crop_gate.reused
+                predictions = self.crop_gate.classify(self.model, [t.id for t in face_tracks], self.faces.faces)
+                if self.metrics is not None and self.crop_gate.reused > reused:
+                    self.metrics.inc("live_crops_reused", self.crop_gate.reused - reused, self.session)
+            with self.lock:
+                for track, pred in zip(face_tracks, predictions):
+                    track.add_prediction(int(np.argmax(pred)), float(np.max(pred) * 100))
+                # The largest face is the primary user
+                primary = self.tracker.primary()
+            classify_ms = (time.perf_counter() - start) * 1000.0
+            self.scheduler.record_classification(classify_ms)
+            self._observe("live.classify", classify_ms)
+
+            if self.on_primary is not None and primary is not None and primary.emotion_index is not None:
+                self.on_primary(primary.emotion_index, primary.confidence, primary.id)
@@ -0,0 +1,229 @@
+import bisect
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+# Upper bounds (ms) of the latency buckets; anything slower lands in the overflow bucket
+BUCKETS_MS = (0.25, 0.5, 1, 2, 3, 5, 7.5, 10, 15, 20, 30, 50, 75, 100, 150, 250, 500, 1000, 2500, 5000)
+
+PROCESS = "process"
+
+
+def rss_bytes():
+    # Current resident set size; falls back to the peak where /proc is unavailable
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Histogram:
+    # Fixed buckets: observing is a bisect and two adds, and memory never grows
+    def __init__(self, bounds=BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, ms):
+        i = bisect.bisect_left(self.bounds, ms)
+        with self.lock:
+            self.counts[i] += 1
+            self.total += ms
+            if ms > self.max:
+                self.max = ms
+
+    def merge(self, other):
+        with other.lock:
+            counts, total, peak = list(other.counts), other.total, other.max
+        with self.lock:
+            self.counts = [a + b for a, b in zip(self.counts, counts)]
+            self.total += total
+            self.max = max(self.max, peak)
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def quantile(self, q):
+        # Linear interpolation inside the bucket holding the q-th observation
+        with self.lock:
+            counts, peak = list(self.counts), self.max
+        n = sum(counts)
+        if n == 0:
+            return 0.0
+        rank = q * n
+        seen = 0
+        for i, c in enumerate(counts):
+            if c and seen + c >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else peak
+                return min(peak, lower + (upper - lower) * (rank - seen) / c)
+            seen += c
+        return peak
+
+    def summary(self):
+        n = self.count
+        return {
+            "count": n,
+            "mean_ms": round(self.total / n, 3) if n else 0.0,
+            "p50_ms": round(self.quantile(0.50), 3),
+            "p95_ms": round(self.quantile(0.95), 3),
+            "p99_ms": round(self.quantile(0.99), 3),
+            "max_ms": round(self.max, 3),
+        }
+
+
+class MetricsRegistry:
+    # Process-wide store of per-(stage, session) histograms, counters and memory samples. Sessions
+    # have no end signal, so one not observed for `session_ttl_s` (or the least recent beyond
+    # `max_sessions`) is retired: its histograms and counters fold into the PROCESS series, so
+    # all-session totals stay whole, and its own series and memory samples are dropped.
+    def __init__(self, memory_samples=120, session_ttl_s=1800.0, max_sessions=100):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.memory = {}
+        self.memory_samples = memory_samples
+        self.session_ttl_s = session_ttl_s
+        self.max_sessions = max_sessions
+        self.last_seen = {}
+
+    def _touch(self, session):
+        if session != PROCESS:
+            self.last_seen[session] = time.monotonic()
+
+    def prune(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            by_age = sorted(self.last_seen, key=self.last_seen.get)
+            expired = [s for s in by_age if now - self.last_seen[s] > self.session_ttl_s]
+            expired += by_age[len(expired):max(len(expired), len(by_age) - self.max_sessions)]
+            for session in expired:
+                self._retire(session)
+        return expired
+
+    def _retire(self, session):
+        # Caller holds self.lock
+        del self.last_seen[session]
+        for stage, owner in [key for key in self.histograms if key[1] == session]:
+            hist = self.histograms.pop((stage, owner))
+            self.histograms.setdefault((stage, PROCESS), Histogram()).merge(hist)
+        for name, owner in [key for key in self.counters if key[1] == session]:
+            self.counters[(name, PROCESS)] = self.counters.get((name, PROCESS), 0) + self.counters.pop((name, owner))
+        self.memory.pop(session, None)
+
+    def histogram(self, stage, session=PROCESS):
+        key = (stage, session)
+        self._touch(session)
+        hist = self.histograms.get(key)
+        if hist is None:
+            # A new series is a cheap moment to retire idle sessions
+            self.prune()
+            with self.lock:
+                hist = self.histograms.setdefault(key, Histogram())
+        return hist
+
+    def observe(self, stage, ms, session=PROCESS):
+        self.histogram(stage, session).observe(ms)
+
+    @contextmanager
+    def timer(self, stage, session=PROCESS):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, (time.perf_counter() - started) * 1000.0, session)
+
+    def inc(self, name, n=1, session=PROCESS):
+        key = (name, session)
+        self._touch(session)
+        if key not in self.counters:
+            self.prune()
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + n
+
+    def sample_memory(self, session=PROCESS):
+        # Process RSS plus traced Python heap (only while tracemalloc is running), kept per session
+        traced, traced_peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        sample = {"ts": time.time(), "rss_bytes": rss_bytes(), "traced_bytes": traced, "traced_peak_bytes": traced_peak}
+        self._touch(session)
+        if session not in self.memory:
+            self.prune()
+        with self.lock:
+            self.memory.setdefault(session, deque(maxlen=self.memory_samples)).append(sample)
+        return sample
+
+    def sessions(self):
+        self.prune()
+        with self.lock:
+            return sorted({s for _, s in self.histograms} | {s for _, s in self.counters} | set(self.memory))
+
+    def stage_summary(self, session=None):
+        # One row per stage; session=None merges every session's histogram for that stage
+        self.prune()
+        with self.lock:
+            items = list(self.histograms.items())
+        merged = {}
+        for (stage, owner), hist in items:
+            if session is not None and owner != session:
+                continue
+            merged.setdefault(stage, Histogram()).merge(hist)
+        return [{"stage": stage, **hist.summary()} for stage, hist in sorted(merged.items())]
+
+    def counter_totals(self, session=None):
+        self.prune()
+        with self.lock:
+            items = list(self.counters.items())
+        totals = {}
+        for (name, owner), value in items:
+            if session is None or owner == session:
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+    def latest_memory(self):
+        self.prune()
+        with self.lock:
+            return {session: samples[-1] for session, samples in self.memory.items() if samples}
+
+    def prometheus(self, prefix="moodmirror"):
+        # Prometheus text exposition format (version 0.0.4)
+        self.prune()
+        with self.lock:
+            histograms = list(self.histograms.items())
+            counters = list(self.counters.items())
+        memory = self.latest_memory()
+
+        lines = [
+            f"# HELP {prefix}_stage_duration_ms Per-stage wall time in milliseconds.",
+            f"# TYPE {prefix}_stage_duration_ms histogram",
+        ]
+        for (stage, session), hist in sorted(histograms):
+            with hist.lock:
+                counts, total = list(hist.counts), hist.total
+            labels = f'stage="{stage}",session="{session}"'
+            cumulative = 0
+            for bound, c in zip(list(hist.bounds) + ["+Inf"], counts):
+                cumulative += c
+                lines.append(f'{prefix}_stage_duration_ms_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{prefix}_stage_duration_ms_sum{{{labels}}} {total}")
+            lines.append(f"{prefix}_stage_duration_ms_count{{{labels}}} {cumulative}")
+
+        for name in sorted({name for (name, _) in counters}):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            for (counter, session), value in sorted(counters):
+                if counter == name:
+                    lines.append(f'{prefix}_{name}_total{{session="{session}"}} {value}')
+
+        lines.append(f"# TYPE {prefix}_process_rss_bytes gauge")
+        lines.append(f"{prefix}_process_rss_bytes {rss_bytes()}")
+        lines.append(f"# TYPE {prefix}_traced_bytes gauge")
+        for session, sample in sorted(memory.items()):
+            lines.append(f'{prefix}_traced_bytes{{session="{session}"}} {sample["traced_bytes"]}')
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,105 @@
+import time
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    # Cheap change detector in front of the Haar cascade. The detection frame is reduced to a grid
+    # of block means and compared with the frame of the last full scan (not the previous frame, so
+    # slow drift still adds up). While too few blocks have changed the scan is skipped; after
+    # `max_static_ms` without a scan one is forced anyway.
+    def __init__(self, grid=(16, 12), block_threshold=6.0, min_changed=0.02, max_static_ms=2000.0):
+        self.grid = grid
+        self.block_threshold = block_threshold
+        self.min_changed = min_changed
+        self.max_static_ms = max_static_ms
+        self.reference = None
+        self.last_scan = 0.0
+        self.changed = 0.0
+        self.checks = 0
+        self.skipped = 0
+        self.motion_scans = 0
+        self.timeout_scans = 0
+
+    def should_scan(self, gray, now=None):
+        now = time.perf_counter() if now is None else now
+        blocks = cv2.resize(gray, self.grid, interpolation=cv2.INTER_AREA).astype(np.int16)
+        self.checks += 1
+
+        if self.reference is not None:
+            self.changed = float(np.mean(np.abs(blocks - self.reference) > self.block_threshold))
+            if self.changed >= self.min_changed:
+                self.motion_scans += 1
+            elif (now - self.last_scan) * 1000.0 >= self.max_static_ms:
+                self.timeout_scans += 1
+            else:
+                self.skipped += 1
+                return False
+
+        self.reference = blocks
+        self.last_scan = now
+        return True
+
+    def stats(self):
+        return {
+            "motion_checks": self.checks,
+            "motion_skipped": self.skipped,
+            "motion_skip_ratio": round(self.skipped / self.checks, 3) if self.checks else 0.0,
+            "motion_scans": self.motion_scans,
+            "timeout_scans": self.timeout_scans,
+            "changed_blocks": round(self.changed, 3),
+        }
+
+
+class CropGate:
+    # Per-face reuse of classification results. Each new 48x48 crop is compared (mean absolute
+    # difference in gray levels) with the last crop the model saw for the same track; below
+    # `threshold` the stored probabilities are reused, until they are `max_age_ms` old.
+    def __init__(self, threshold=4.0, max_age_ms=1500.0):
+        self.threshold = threshold
+        self.max_age_ms = max_age_ms
+        self.entries = {}
+        self.checked = 0
+        self.reused = 0
+        self.forward_calls = 0
+        self.forward_skipped = 0
+
+    def classify(self, model, keys, crops, now=None):
+        # keys[i] identifies the face of crops[i]; returns (N, classes) probabilities
+        now = time.perf_counter() if now is None else now
+        probs = [None] * len(keys)
+        fresh = []
+        for i, key in enumerate(keys):
+            entry = self.entries.get(key)
+            if entry is not None:
+                crop, prob, at = entry
+                if (now - at) * 1000.0 < self.max_age_ms and \
+                        np.mean(cv2.absdiff(crop, crops[i])) < self.threshold:
+                    probs[i] = prob
+                    continue
+            fresh.append(i)
+        self.checked += len(keys)
+        self.reused += len(keys) - len(fresh)
+
+        if fresh:
+            self.forward_calls += 1
+            predictions = np.asarray(model(crops[fresh], training=False))
+            for i, prob in zip(fresh, predictions):
+                self.entries[keys[i]] = (crops[i].copy(), prob, now)
+                probs[i] = prob
+        else:
+            self.forward_skipped += 1
+
+        # Entries past their age can never be reused again
+        self.entries = {k: e for k, e in self.entries.items() if (now - e[2]) * 1000.0 < self.max_age_ms}
+        return np.stack(probs)
+
+    def stats(self):
+        return {
+            "crops_checked": self.checked,
+            "crops_reused": self.reused,
+            "crop_reuse_ratio": round(self.reused / self.checked, 3) if self.checked else 0.0,
+            "classify_forward_calls": self.forward_calls,
+            "classify_forward_skipped": self.forward_skipped,
+        }
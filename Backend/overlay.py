@@ -0,0 +1,54 @@
+import cv2
+
+# Futuristic Bounding Box Styling (BGR)
+EMOTION_COLORS = {
+    "Happy": (81, 185, 16), "Sad": (235, 99, 37),
+    "Angry": (38, 38, 220), "Surprise": (11, 158, 245),
+    "Neutral": (139, 116, 100), "Fear": (237, 58, 124),
+    "Disgust": (22, 204, 132), "Detecting...": (150, 150, 150)
+}
+
+
+def draw_prediction(img, emotion_text, confidence, face_coords):
+    (x, y, w, h) = face_coords
+
+    # Make the bounding box slightly broader around the face
+    pad_x = int(w * 0.15)
+    pad_y = int(h * 0.15)
+    x = max(0, x - pad_x)
+    y = max(0, y - pad_y)
+    w = w + (pad_x * 2)
+    h = h + (pad_y * 2)
+
+    color = EMOTION_COLORS.get(emotion_text, (255, 255, 255))
+    thickness = 4
+    length = 30
+
+    # Thicker Full Box
+    cv2.rectangle(img, (x, y), (x+w, y+h), color, 3)
+
+    # Glowing Corners
+    cv2.line(img, (x, y), (x + length, y), color, thickness)
+    cv2.line(img, (x, y), (x, y + length), color, thickness)
+    cv2.line(img, (x+w, y), (x+w - length, y), color, thickness)
+    cv2.line(img, (x+w, y), (x+w, y + length), color, thickness)
+    cv2.line(img, (x, y+h), (x + length, y+h), color, thickness)
+    cv2.line(img, (x, y+h), (x, y+h - length), color, thickness)
+    cv2.line(img, (x+w, y+h), (x+w - length, y+h), color, thickness)
+    cv2.line(img, (x+w, y+h), (x+w, y+h - length), color, thickness)
+
+    # Dynamic Overlay Plate
+    label = f"{emotion_text} | {confidence:.1f}%"
+    (tw, th), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_DUPLEX, 0.6, 1)
+
+    # Background label plate
+    cv2.rectangle(img, (x, y - th - 12), (x + tw + 10, y), color, -1)
+    # Text
+    cv2.putText(img, label, (x + 5, y - 5), cv2.FONT_HERSHEY_DUPLEX, 0.6, (255, 255, 255), 1, cv2.LINE_AA)
+
+
+def draw_predictions(img, predictions):
+    for emotion_text, confidence, face_coords in predictions:
+        if face_coords is not None:
+            draw_prediction(img, emotion_text, confidence, face_coords)
+    return img
@@ -0,0 +1,59 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def content_key(data, *config):
+    # Digest of the raw upload plus everything that changes its result (backend, detector settings)
+    digest = hashlib.blake2b(data, digest_size=16)
+    for part in config:
+        digest.update(repr(part).encode())
+    return digest.hexdigest()
+
+
+def scoped_key(key, *scope):
+    # One image, different consumers (page, preview size): each scope gets its own cache slot,
+    # since they store different result shapes
+    return ":".join([key, *(str(part) for part in scope)])
+
+
+class ResultCache:
+    # Thread-safe LRU of analysis results, bounded by entry count and by total payload bytes
+    def __init__(self, max_entries=256, max_bytes=64 * 2**20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, nbytes=0):
+        if nbytes > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            self.entries[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while len(self.entries) > self.max_entries or self.nbytes > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.nbytes -= evicted
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.nbytes, "hits": self.hits, "misses": self.misses}
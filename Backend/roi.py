@@ -0,0 +1,67 @@
+import time
+
+from engine import nms
+
+
+class RoiSearch:
+    # Incremental detection: between full-frame scans only windows around the last known faces are
+    # searched, and only at scales near each face's previous size. A full scan still runs every
+    # `full_every_ms` to pick up new faces, and right after a known face goes missing.
+    def __init__(self, margin=0.5, scale_range=(0.75, 1.33), full_every_ms=1000.0):
+        self.margin = margin
+        self.scale_range = scale_range
+        self.full_every_ms = full_every_ms
+        self.last_full = 0.0
+        self.force_full = True
+        self.roi_scans = 0
+        self.full_scans = 0
+        self.pixels = 0
+        self.frame_pixels = 0
+        self.total_pixels = 0
+        self.total_frame_pixels = 0
+
+    def detect(self, cascade, gray, boxes, detect_kwargs, now=None):
+        # `boxes` are the previous faces in `gray` coordinates; returns this pass's faces in the same
+        now = time.perf_counter() if now is None else now
+        height, width = gray.shape[:2]
+
+        if self.force_full or not boxes or (now - self.last_full) * 1000.0 >= self.full_every_ms:
+            found = [tuple(int(v) for v in box) for box in cascade.detectMultiScale(gray, **detect_kwargs)]
+            scanned = width * height
+            self.last_full = now
+            self.force_full = False
+            self.full_scans += 1
+        else:
+            found, scanned = [], 0
+            low, high = self.scale_range
+            min_side = detect_kwargs.get("minSize", (0, 0))[0]
+            for (x, y, w, h) in boxes:
+                side = max(w, h)
+                pad = int(side * self.margin)
+                x0, y0 = max(0, x - pad), max(0, y - pad)
+                roi = gray[y0:min(height, y + h + pad), x0:min(width, x + w + pad)]
+                scanned += roi.size
+                kwargs = dict(detect_kwargs, minSize=(max(min_side, int(side * low)),) * 2,
+                              maxSize=(int(side * high) + 1,) * 2)
+                found += [(int(fx) + x0, int(fy) + y0, int(fw), int(fh))
+                          for (fx, fy, fw, fh) in cascade.detectMultiScale(roi, **kwargs)]
+            # Windows of neighbouring faces overlap, so one face can be found twice
+            found = nms(found)
+            # A face that slipped out of its window is looked for over the whole frame next time
+            self.force_full = len(found) < len(boxes)
+            self.roi_scans += 1
+
+        self.pixels = scanned
+        self.frame_pixels = width * height
+        self.total_pixels += scanned
+        self.total_frame_pixels += width * height
+        return found
+
+    def stats(self):
+        return {
+            "roi_scans": self.roi_scans,
+            "full_scans": self.full_scans,
+            "pixels_scanned": self.pixels,
+            "frame_pixels": self.frame_pixels,
+            "scan_pixel_ratio": round(self.total_pixels / self.total_frame_pixels, 3) if self.total_frame_pixels else 1.0,
+        }
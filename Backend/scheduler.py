@@ -0,0 +1,132 @@
+import time
+
+
+class AdaptiveScheduler:
+    # Detection downscale steps, from sharpest to cheapest. Anything sharper than the 0.5 start is
+    # only used once detection already runs on every frame with load to spare.
+    SCALES = (0.75, 0.5, 0.4, 0.3, 0.25)
+
+    def __init__(self, target_fps=15, latency_budget_ms=None, target_load=0.6,
+                 max_interval=15, max_classify_every=4, min_face=60, adjust_every=15):
+        # Average processing time we may spend per output frame, and the worst single-frame stall
+        self.frame_budget_ms = 1000.0 / target_fps
+        self.latency_budget_ms = latency_budget_ms or self.frame_budget_ms
+        self.target_fps = target_fps
+        self.target_load = target_load
+        self.max_interval = max_interval
+        self.max_classify_every = max_classify_every
+        self.min_face = min_face
+        self.adjust_every = adjust_every
+
+        # Start at the previous fixed settings: every 3rd frame at half resolution
+        self.interval = 3
+        self.base_scale_idx = self.SCALES.index(0.5)
+        self.scale_idx = self.base_scale_idx
+        self.classify_every = 1
+
+        self.frame_ms = 0.0
+        self.detect_ms = 0.0
+        self.classify_ms = 0.0
+        self.spike_ms = 0.0
+        self.fps = 0.0
+        self._frames_since_detect = 0
+        self._frames_since_adjust = 0
+        self._detections = 0
+        self._last_frame_at = None
+
+    @staticmethod
+    def _ewma(old, new, alpha=0.2):
+        return new if old == 0.0 else old + alpha * (new - old)
+
+    @property
+    def scale(self):
+        return self.SCALES[self.scale_idx]
+
+    @property
+    def min_size(self):
+        # Keep the smallest detectable face constant in full-resolution pixels
+        side = max(12, int(round(self.min_face * self.scale)))
+        return (side, side)
+
+    def should_detect(self):
+        self._frames_since_detect += 1
+        if self._frames_since_detect >= self.interval:
+            self._frames_since_detect = 0
+            self._detections += 1
+            return True
+        return False
+
+    def should_classify(self):
+        return self._detections % self.classify_every == 0
+
+    def record_detection(self, detect_ms):
+        self.detect_ms = self._ewma(self.detect_ms, detect_ms)
+        self.spike_ms = self.detect_ms + self.classify_ms
+
+    def record_classification(self, classify_ms):
+        self.classify_ms = self._ewma(self.classify_ms, classify_ms)
+        self.spike_ms = self.detect_ms + self.classify_ms
+
+    def record_frame(self, frame_ms):
+        now = time.perf_counter()
+        if self._last_frame_at is not None:
+            self.fps = self._ewma(self.fps, 1.0 / max(now - self._last_frame_at, 1e-6), alpha=0.1)
+        self._last_frame_at = now
+
+        self.frame_ms = self._ewma(self.frame_ms, frame_ms, alpha=0.1)
+        self._frames_since_adjust += 1
+        if self._frames_since_adjust >= self.adjust_every:
+            self._frames_since_adjust = 0
+            self._adjust()
+
+    def work_ms(self):
+        # Average processing spent per output frame, including the amortized detection/classification work
+        return self.frame_ms + (self.detect_ms + self.classify_ms / self.classify_every) / self.interval
+
+    def _adjust(self):
+        load = self.work_ms() / self.frame_budget_ms
+
+        # A detection + classification pass slower than the latency budget makes results lag the video,
+        # and only cheaper detection/classification fixes that
+        if self.spike_ms > self.latency_budget_ms:
+            if self.scale_idx < len(self.SCALES) - 1:
+                self.scale_idx += 1
+            elif self.classify_every < self.max_classify_every:
+                self.classify_every += 1
+            return
+
+        if load > self.target_load:
+            # Degrade: give up extra sharpness, detect less often, then on a smaller frame,
+            # then classify less often
+            if self.scale_idx < self.base_scale_idx:
+                self.scale_idx += 1
+            elif self.interval < self.max_interval:
+                self.interval += 1
+            elif self.scale_idx < len(self.SCALES) - 1:
+                self.scale_idx += 1
+            elif self.classify_every < self.max_classify_every:
+                self.classify_every += 1
+        elif load < self.target_load / 2 and self.spike_ms < self.latency_budget_ms / 2:
+            # Recover in reverse order
+            if self.classify_every > 1:
+                self.classify_every -= 1
+            elif self.scale_idx > self.base_scale_idx:
+                self.scale_idx -= 1
+            elif self.interval > 1:
+                self.interval -= 1
+            elif self.scale_idx > 0:
+                self.scale_idx -= 1
+
+    def settings(self):
+        return {
+            "detect_interval": self.interval,
+            "detect_scale": self.scale,
+            "classify_every": self.classify_every,
+            "fps": round(self.fps, 1),
+            "frame_ms": round(self.frame_ms, 2),
+            "work_ms": round(self.work_ms(), 2),
+            "detect_ms": round(self.detect_ms, 2),
+            "classify_ms": round(self.classify_ms, 2),
+            "frame_budget_ms": round(self.frame_budget_ms, 2),
+            "latency_budget_ms": round(self.latency_budget_ms, 2),
+        }
@@ -0,0 +1,202 @@
+import queue
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from aggregates import NUM_LABELS, merge_buckets
+from history import HISTORY_DTYPE
+
+SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS detections (
+        session TEXT NOT NULL,
+        ts_ms INTEGER NOT NULL,
+        label INTEGER NOT NULL,
+        confidence REAL NOT NULL,
+        track INTEGER NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_detections_session_time ON detections (session, ts_ms)",
+    "CREATE INDEX IF NOT EXISTS idx_detections_session_track ON detections (session, track, ts_ms)",
+)
+
+_STOP = object()
+
+
+class _Command:
+    def __init__(self, sql=None, params=()):
+        self.sql = sql
+        self.params = params
+        self.error = None
+        self.done = threading.Event()
+
+
+class DetectionStore:
+    # Append-only detection log in WAL-mode SQLite. Callers only enqueue a tuple; a background
+    # writer commits rows in batches of up to `flush_rows` or every `flush_interval` seconds.
+    def __init__(self, path="moodmirror.db", flush_rows=512, flush_interval=1.0):
+        self.path = path
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.queue = queue.SimpleQueue()
+        # Rows lost to failed writes, and the error behind the latest failure
+        self.failed_rows = 0
+        self.last_error = None
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        for statement in SCHEMA:
+            conn.execute(statement)
+        conn.commit()
+        conn.close()
+
+        self.writer = threading.Thread(target=self._write_loop, name="moodmirror-store", daemon=True)
+        self.writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # ---------- producers (any thread) ----------
+    def record(self, session, ts_ms, label, confidence, track=-1):
+        self.queue.put((session, int(ts_ms), int(label), float(confidence), int(track)))
+
+    def delete_session(self, session):
+        # Goes through the writer so it lands after every row already queued
+        self._command("DELETE FROM detections WHERE session = ?", (session,))
+
+    def flush(self):
+        self._command()
+
+    def _command(self, sql=None, params=()):
+        command = _Command(sql, params)
+        self.queue.put(command)
+        # The writer always answers; the liveness check only guards against it being gone entirely
+        while not command.done.wait(1.0):
+            if not self.writer.is_alive():
+                raise RuntimeError("detection store writer is not running")
+        if command.error is not None:
+            raise command.error
+
+    def close(self):
+        self.queue.put(_STOP)
+        self.writer.join()
+
+    # ---------- writer thread ----------
+    def _write_loop(self):
+        conn = self._connect()
+        running = True
+        while running:
+            item = self.queue.get()
+            rows, commands = [], []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is _STOP:
+                    running = False
+                    break
+                if isinstance(item, _Command):
+                    commands.append(item)
+                    break
+                rows.append(item)
+                if len(rows) >= self.flush_rows:
+                    break
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+
+            # A failed batch (disk full, database locked past the timeout) is rolled back and
+            # reported to whoever is waiting on it; the writer itself keeps going
+            try:
+                with conn:
+                    if rows:
+                        conn.executemany("INSERT INTO detections VALUES (?, ?, ?, ?, ?)", rows)
+                    for command in commands:
+                        if command.sql:
+                            conn.execute(command.sql, command.params)
+            except Exception as exc:
+                self.failed_rows += len(rows)
+                self.last_error = exc
+                for command in commands:
+                    command.error = exc
+            finally:
+                for command in commands:
+                    command.done.set()
+        conn.close()
+
+    # ---------- queries ----------
+    def _fetch(self, sql, params):
+        conn = self._connect()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _where(session, start_ms=None, end_ms=None):
+        sql = " WHERE session = ?"
+        params = [session]
+        if start_ms is not None:
+            sql += " AND ts_ms >= ?"
+            params.append(int(start_ms))
+        if end_ms is not None:
+            sql += " AND ts_ms < ?"
+            params.append(int(end_ms))
+        return sql, params
+
+    def query(self, session, start_ms=None, end_ms=None):
+        where, params = self._where(session, start_ms, end_ms)
+        rows = self._fetch("SELECT ts_ms, label, confidence, track FROM detections" + where + " ORDER BY ts_ms", params)
+        return np.array(rows, dtype=HISTORY_DTYPE) if rows else np.zeros(0, dtype=HISTORY_DTYPE)
+
+    def page(self, session, start_ms=None, offset=0, limit=50):
+        # Newest first, one page at a time for the log table
+        where, params = self._where(session, start_ms)
+        rows = self._fetch(
+            "SELECT ts_ms, label, confidence, track FROM detections" + where + " ORDER BY ts_ms DESC LIMIT ? OFFSET ?",
+            params + [int(limit), int(offset)]
+        )
+        return np.array(rows, dtype=HISTORY_DTYPE) if rows else np.zeros(0, dtype=HISTORY_DTYPE)
+
+    def label_totals(self, session, start_ms=None):
+        # Per-emotion counts and the overall confidence sum, aggregated by SQLite
+        where, params = self._where(session, start_ms)
+        counts = np.zeros(NUM_LABELS, dtype=np.int64)
+        conf_sum = 0.0
+        for label, n, total in self._fetch(
+            "SELECT label, COUNT(*), SUM(confidence) FROM detections" + where + " GROUP BY label", params
+        ):
+            counts[label] = n
+            conf_sum += total
+        return counts, conf_sum
+
+    def span(self, session, start_ms=None, end_ms=None):
+        # (first, last) timestamp, or (None, None) for an empty range
+        where, params = self._where(session, start_ms, end_ms)
+        return tuple(self._fetch("SELECT MIN(ts_ms), MAX(ts_ms) FROM detections" + where, params)[0])
+
+    def bucket_columns(self, session, width_ms, start_ms=None, end_ms=None):
+        # Bucket index (ts_ms // width_ms), label, count, min, max and sum of confidence per (bucket, label)
+        where, params = self._where(session, start_ms, end_ms)
+        rows = self._fetch(
+            "SELECT ts_ms / ?, label, COUNT(*), MIN(confidence), MAX(confidence), SUM(confidence) FROM detections"
+            + where + " GROUP BY 1, 2",
+            [int(width_ms)] + params
+        )
+        if not rows:
+            return [np.zeros(0, dtype=np.int64)] * 6
+        return [np.array(c) for c in zip(*rows)]
+
+    def buckets(self, session, start_ms=None, end_ms=None, budget=240, min_width_ms=1000):
+        # Confidence min/mean/max per time bucket, with the width chosen so at most `budget` buckets come back
+        first, last = self.span(session, start_ms, end_ms)
+        if first is None:
+            return merge_buckets(*([np.zeros(0, dtype=np.int64)] * 6), min_width_ms)
+        # Buckets are aligned to multiples of the width, so the span may straddle one extra
+        width = max(min_width_ms, -(-(last - first + 1) // (budget - 1)))
+        return merge_buckets(*self.bucket_columns(session, width, start_ms, end_ms), width)
+
+    def count(self, session, start_ms=None):
+        where, params = self._where(session, start_ms)
+        return self._fetch("SELECT COUNT(*) FROM detections" + where, params)[0][0]
@@ -0,0 +1,151 @@
+import itertools
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0.0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0.0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _create_cv_tracker():
+    # MOSSE/KCF ship with opencv-contrib; plain builds fall back to constant-velocity motion
+    for name in ("legacy.TrackerMOSSE_create", "TrackerKCF_create", "legacy.TrackerKCF_create"):
+        factory = cv2
+        for part in name.split("."):
+            factory = getattr(factory, part, None)
+            if factory is None:
+                break
+        if factory is not None:
+            return factory()
+    return None
+
+
+class Track:
+    def __init__(self, track_id, box, frame, window):
+        self.id = track_id
+        self.xywh = np.array(box, dtype=np.float32)
+        # Last detected box and the frame it came from; velocity is measured between detections,
+        # never from the position predict() has already moved forward
+        self.detected = self.xywh.copy()
+        self.velocity = np.zeros(2, dtype=np.float32)
+        self.detected_at = frame
+        self.window = deque(maxlen=window)
+        self.emotion_index = None
+        self.confidence = 0.0
+        self.misses = 0
+        self.cv_tracker = None
+
+    @property
+    def box(self):
+        x, y, w, h = self.xywh
+        return (int(round(x)), int(round(y)), int(round(w)), int(round(h)))
+
+    @property
+    def area(self):
+        return float(self.xywh[2] * self.xywh[3])
+
+    def add_prediction(self, emotion_index, confidence):
+        # Majority vote over this face's own recent predictions
+        self.window.append(emotion_index)
+        self.emotion_index = max(set(self.window), key=self.window.count)
+        self.confidence = confidence
+
+
+class FaceTracker:
+    def __init__(self, iou_threshold=0.3, max_misses=2, window=5, use_cv_tracker=True):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.window = window
+        self.use_cv_tracker = use_cv_tracker
+        self.tracks = []
+        self.frame = 0
+        self._ids = itertools.count(1)
+
+    def _start_cv_tracker(self, track, img):
+        if not self.use_cv_tracker:
+            return
+        track.cv_tracker = _create_cv_tracker()
+        if track.cv_tracker is not None:
+            track.cv_tracker.init(img, track.box)
+
+    def _match(self, boxes):
+        pairs = []
+        for ti, track in enumerate(self.tracks):
+            for bi, box in enumerate(boxes):
+                overlap = iou(track.xywh, box)
+                if overlap >= self.iou_threshold:
+                    pairs.append((overlap, ti, bi))
+                else:
+                    # Centroid fallback for fast moves that break the overlap
+                    tx, ty, tw, th = track.xywh
+                    bx, by, bw, bh = box
+                    dist = np.hypot((tx + tw / 2) - (bx + bw / 2), (ty + th / 2) - (by + bh / 2))
+                    if dist < 0.5 * max(tw, th):
+                        pairs.append((overlap - 1.0 + 1.0 / (1.0 + dist), ti, bi))
+
+        matches, used_tracks, used_boxes = [], set(), set()
+        for _, ti, bi in sorted(pairs, reverse=True):
+            if ti not in used_tracks and bi not in used_boxes:
+                matches.append((ti, bi))
+                used_tracks.add(ti)
+                used_boxes.add(bi)
+        return matches, used_tracks, used_boxes
+
+    def update(self, img, boxes):
+        # Fold a fresh detection pass into the tracks; returns the track owning each box.
+        # Only predict() counts frames, so the detection belongs to the frame predict() last saw.
+        matches, used_tracks, used_boxes = self._match(boxes)
+        assigned = [None] * len(boxes)
+
+        for ti, bi in matches:
+            track = self.tracks[ti]
+            new_xywh = np.array(boxes[bi], dtype=np.float32)
+            elapsed = max(1, self.frame - track.detected_at)
+            track.velocity = (new_xywh[:2] - track.detected[:2]) / elapsed
+            track.xywh = new_xywh
+            track.detected = new_xywh.copy()
+            track.detected_at = self.frame
+            track.misses = 0
+            self._start_cv_tracker(track, img)
+            assigned[bi] = track
+
+        survivors = []
+        for ti, track in enumerate(self.tracks):
+            if ti not in used_tracks:
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    continue
+            survivors.append(track)
+        self.tracks = survivors
+
+        for bi, box in enumerate(boxes):
+            if bi not in used_boxes:
+                track = Track(next(self._ids), box, self.frame, self.window)
+                self._start_cv_tracker(track, img)
+                self.tracks.append(track)
+                assigned[bi] = track
+        return assigned
+
+    def predict(self, img):
+        # Carry every track forward on a frame without detection
+        self.frame += 1
+        for track in self.tracks:
+            if track.cv_tracker is not None:
+                ok, box = track.cv_tracker.update(img)
+                if ok:
+                    track.xywh = np.array(box, dtype=np.float32)
+                    continue
+            track.xywh[:2] += track.velocity
+
+    def primary(self):
+        # Largest face seen by the latest detection pass
+        current = [t for t in self.tracks if t.misses == 0]
+        return max(current, key=lambda t: t.area) if current else None
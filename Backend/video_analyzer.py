@@ -0,0 +1,274 @@
+"""Offline emotion timeline for recorded video files (MP4/MKV/...).
+
+    python video_analyzer.py session.mp4 -o timeline.csv --annotate annotated.mp4
+
+Decoding, face detection and batched classification run as separate stages
+connected by bounded queues, so memory stays flat however long the video is.
+"""
+import argparse
+import csv
+import os
+import queue
+import sys
+import threading
+import time
+
+import av
+import cv2
+import numpy as np
+
+from backends import BACKENDS, DEFAULT_BACKEND, load_backend
+from engine import BATCH_SIZE, INPUT_SIZE, LIVE_DETECT, load_labels, predict_in_batches, preprocess_face, thread_face_detector
+from overlay import draw_predictions
+
+_END = object()
+
+
+class Frame:
+    __slots__ = ("index", "time", "image", "boxes", "crops", "analyzed")
+
+    def __init__(self, index, time, image):
+        self.index = index
+        self.time = time
+        self.image = image
+        self.boxes = []
+        self.crops = []
+        self.analyzed = False
+
+
+# ===============================
+# 1️⃣ Decode Stage
+# ===============================
+def decode_frames(path, out_q, slots, stop):
+    try:
+        with av.open(path) as container:
+            stream = container.streams.video[0]
+            # Let FFmpeg decode with its own frame/slice threads
+            stream.thread_type = "AUTO"
+            for index, frame in enumerate(container.decode(stream)):
+                # A slot is held until the frame has been written, which caps frames in flight
+                slots.acquire()
+                if stop.is_set():
+                    break
+                t = float(frame.pts * stream.time_base) if frame.pts is not None else 0.0
+                out_q.put(Frame(index, t, frame.to_ndarray(format="bgr24")))
+    finally:
+        out_q.put(_END)
+
+
+# ===============================
+# 2️⃣ Detect Stage
+# ===============================
+def detect_frames(in_q, out_q, stride, downscale, detect_kwargs):
+    cascade = thread_face_detector()
+    scale = 1.0 / downscale
+    while True:
+        item = in_q.get()
+        if item is _END:
+            # Pass the sentinel on to the sibling workers and the classifier
+            in_q.put(_END)
+            out_q.put(_END)
+            return
+
+        if item.index % stride == 0:
+            gray = cv2.cvtColor(item.image, cv2.COLOR_BGR2GRAY)
+            small_gray = cv2.resize(gray, (0, 0), fx=downscale, fy=downscale)
+            for (x, y, w, h) in cascade.detectMultiScale(small_gray, **detect_kwargs):
+                # Scale back and crop from the full-resolution frame
+                box = (int(x * scale), int(y * scale), int(w * scale), int(h * scale))
+                face = preprocess_face(gray, box)
+                if face is not None:
+                    item.boxes.append(box)
+                    item.crops.append(face)
+            item.analyzed = True
+        out_q.put(item)
+
+
+# ===============================
+# 3️⃣ Classify + Output Stage
+# ===============================
+class TimelineWriter:
+    def __init__(self, path, labels):
+        self.prob_columns = [f"p_{labels[i]}" for i in sorted(labels)]
+        self.header = ["frame", "time", "face", "x", "y", "w", "h", "label", "confidence"] + self.prob_columns
+        self.parquet = path.lower().endswith(".parquet")
+        self.rows = []
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            self.pa = pa
+            self.schema = pa.schema(
+                [("frame", pa.int64()), ("time", pa.float64()), ("face", pa.int32())]
+                + [(c, pa.int32()) for c in ("x", "y", "w", "h")]
+                + [("label", pa.string()), ("confidence", pa.float32())]
+                + [(c, pa.float32()) for c in self.prob_columns]
+            )
+            self.writer = pq.ParquetWriter(path, self.schema)
+        else:
+            self.f = open(path, "w", newline="")
+            self.writer = csv.writer(self.f)
+            self.writer.writerow(self.header)
+
+    def add(self, frame, results):
+        if not results:
+            self.rows.append([frame.index, round(frame.time, 4), -1, None, None, None, None, None, None] + [None] * len(self.prob_columns))
+        for i, (label, prob, box) in enumerate(results):
+            self.rows.append([frame.index, round(frame.time, 4), i, *box, label, float(prob.max())] + [float(p) for p in prob])
+        if len(self.rows) >= 4096:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        if self.parquet:
+            columns = list(zip(*self.rows))
+            self.writer.write_table(self.pa.table(
+                {name: list(col) for name, col in zip(self.header, columns)}, schema=self.schema
+            ))
+        else:
+            self.writer.writerows(self.rows)
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        if self.parquet:
+            self.writer.close()
+        else:
+            self.f.close()
+
+
+class AnnotatedWriter:
+    def __init__(self, path, source, codec):
+        with av.open(source) as probe:
+            in_stream = probe.streams.video[0]
+            rate = in_stream.average_rate or 30
+            width, height = in_stream.codec_context.width, in_stream.codec_context.height
+        self.container = av.open(path, mode="w")
+        self.stream = self.container.add_stream(codec, rate=rate)
+        self.stream.width = width
+        self.stream.height = height
+        self.stream.pix_fmt = "yuv420p"
+
+    def write(self, image):
+        frame = av.VideoFrame.from_ndarray(image, format="bgr24")
+        for packet in self.stream.encode(frame):
+            self.container.mux(packet)
+
+    def close(self):
+        for packet in self.stream.encode():
+            self.container.mux(packet)
+        self.container.close()
+
+
+def analyze_video(args):
+    model = load_backend(args.backend, args.model)
+    emotion_dict = {k: v.capitalize() for k, v in load_labels(args.labels).items()}
+
+    max_pending = args.batch_size
+    slots = threading.Semaphore(max_pending * 2 + args.detect_workers * 4)
+    stop = threading.Event()
+    decoded_q = queue.Queue(maxsize=args.queue_size)
+    detected_q = queue.Queue(maxsize=args.queue_size)
+
+    threads = [threading.Thread(target=decode_frames, args=(args.video, decoded_q, slots, stop), daemon=True)]
+    for _ in range(args.detect_workers):
+        threads.append(threading.Thread(
+            target=detect_frames,
+            args=(decoded_q, detected_q, args.stride, args.downscale, LIVE_DETECT),
+            daemon=True
+        ))
+    for t in threads:
+        t.start()
+
+    timeline = TimelineWriter(args.output, emotion_dict)
+    annotated = AnnotatedWriter(args.annotate, args.video, args.codec) if args.annotate else None
+
+    frames = faces = 0
+    last_time = 0.0
+    last_predictions = []
+    started = time.perf_counter()
+
+    def flush(ready):
+        nonlocal frames, faces, last_time, last_predictions
+        crops = [c for item in ready for c in item.crops]
+        probs = predict_in_batches(model, np.asarray(crops, dtype=np.uint8).reshape(-1, INPUT_SIZE, INPUT_SIZE, 1), args.batch_size)
+        offset = 0
+        for item in ready:
+            if item.analyzed:
+                results = []
+                for box, prob in zip(item.boxes, probs[offset:offset + len(item.boxes)]):
+                    results.append((emotion_dict[int(np.argmax(prob))], prob, box))
+                offset += len(item.boxes)
+                timeline.add(item, results)
+                last_predictions = [(label, float(prob.max() * 100), box) for label, prob, box in results]
+                faces += len(results)
+            if annotated is not None:
+                annotated.write(draw_predictions(item.image, last_predictions))
+            frames += 1
+            last_time = item.time
+            slots.release()
+        ready.clear()
+
+    # Detection workers finish out of order; frames are re-sequenced before output
+    reorder = {}
+    ready = []
+    ready_crops = 0
+    next_index = 0
+    finished_workers = 0
+    try:
+        while finished_workers < args.detect_workers:
+            try:
+                item = detected_q.get(timeout=0.05)
+            except queue.Empty:
+                if ready:
+                    flush(ready)
+                    ready_crops = 0
+                continue
+            if item is _END:
+                finished_workers += 1
+                continue
+
+            reorder[item.index] = item
+            while next_index in reorder:
+                item = reorder.pop(next_index)
+                ready.append(item)
+                ready_crops += len(item.crops)
+                next_index += 1
+            if ready_crops >= args.batch_size or len(ready) >= max_pending:
+                flush(ready)
+                ready_crops = 0
+        flush(ready)
+    finally:
+        stop.set()
+        slots.release()
+        timeline.close()
+        if annotated is not None:
+            annotated.close()
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    print(
+        f"Done: {frames} frames, {faces} faces in {elapsed:.1f}s | "
+        f"{frames / elapsed:.1f} frames/sec, {last_time / elapsed:.1f}x real time",
+        file=sys.stderr
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-frame/per-face emotion timeline for a video file.")
+    parser.add_argument("video")
+    parser.add_argument("-o", "--output", required=True, help="Timeline file (.csv, or .parquet with pyarrow installed)")
+    parser.add_argument("--annotate", help="Optional path for an annotated copy of the video")
+    parser.add_argument("--codec", default="libx264", help="Encoder for --annotate")
+    parser.add_argument("--model", default="ferNet.h5")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, choices=BACKENDS)
+    parser.add_argument("--labels", default="class_labels.json")
+    parser.add_argument("--stride", type=int, default=1, help="Analyze every Nth frame; others reuse the last result")
+    parser.add_argument("--downscale", type=float, default=0.5, help="Detection runs on the frame scaled by this factor")
+    parser.add_argument("--detect-workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--queue-size", type=int, default=16, help="Capacity of each inter-stage queue")
+    analyze_video(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
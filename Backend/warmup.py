@@ -0,0 +1,34 @@
+import threading
+import time
+
+
+class BackgroundLoader:
+    # Starts `load` on a daemon thread as soon as it is created; get() blocks until it has finished
+    # and returns its result (or re-raises its exception) to every caller
+    def __init__(self, load, name="moodmirror-warmup"):
+        self.started = time.perf_counter()
+        self.ready_ms = None
+        self._result = None
+        self._error = None
+        self._done = threading.Event()
+        threading.Thread(target=self._run, args=(load,), name=name, daemon=True).start()
+
+    def _run(self, load):
+        try:
+            self._result = load()
+        except BaseException as exc:
+            self._error = exc
+        finally:
+            self.ready_ms = (time.perf_counter() - self.started) * 1000.0
+            self._done.set()
+
+    @property
+    def ready(self):
+        return self._done.is_set()
+
+    def get(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise TimeoutError("model is still loading")
+        if self._error is not None:
+            raise self._error
+        return self._result
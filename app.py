@@ -4,10 +4,21 @@ import pandas as pd
 import altair as alt
 from collections import deque
 from datetime import datetime
+import time
+import uuid
 import json
-import cv2
-import av
-from streamlit_webrtc import webrtc_streamer, VideoTransformerBase, WebRtcMode
+import os
+import sys
+
+# Shared inference helpers live next to the backend scripts.
+# Only light modules are imported here; OpenCV, TensorFlow and WebRTC load on the pages that use them.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "Backend"))
+from events import EventChannel
+from history import DetectionHistory, now_ms
+from store import DetectionStore
+from metrics import MetricsRegistry
+from result_cache import ResultCache, content_key, scoped_key
+from warmup import BackgroundLoader
 
 # =========================
 # Page Config
@@ -125,7 +136,8 @@ div[data-testid="stRadio"] span[data-testid="stMarkdownContainer"] p {
 div[data-testid="stRadio"] label:nth-child(1) span[data-testid="stMarkdownContainer"] p::before { content: "🏠 "; margin-right: 6px; font-size: 16px; }
 div[data-testid="stRadio"] label:nth-child(2) span[data-testid="stMarkdownContainer"] p::before { content: "📷 "; margin-right: 6px; font-size: 16px; }
 div[data-testid="stRadio"] label:nth-child(3) span[data-testid="stMarkdownContainer"] p::before { content: "📊 "; margin-right: 6px; font-size: 16px; }
-div[data-testid="stRadio"] label:nth-child(4) span[data-testid="stMarkdownContainer"] p::before { content: "ℹ️ "; margin-right: 6px; font-size: 16px; }
+div[data-testid="stRadio"] label:nth-child(4) span[data-testid="stMarkdownContainer"] p::before { content: "⚡ "; margin-right: 6px; font-size: 16px; }
+div[data-testid="stRadio"] label:nth-child(5) span[data-testid="stMarkdownContainer"] p::before { content: "ℹ️ "; margin-right: 6px; font-size: 16px; }
 
 /* Hover State */
 div[data-testid="stRadio"] label:hover {
@@ -405,52 +417,58 @@ div[data-testid="stRadio"] > label {
 </style>
 """, unsafe_allow_html=True)
 
+# =========================
+# Performance Metrics
+# =========================
+@st.cache_resource
+def load_metrics():
+    # Process-wide stage histograms and counters; MOODMIRROR_TRACEMALLOC=1 also traces the Python heap
+    if os.environ.get("MOODMIRROR_TRACEMALLOC") == "1":
+        import tracemalloc
+        tracemalloc.start()
+    return MetricsRegistry()
+
+metrics = load_metrics()
+
 # =========================
 # Load Model
 # =========================
+def _load_engine():
+    # Runs on the warm-up thread, so TensorFlow's import and the model load never block a page
+    from backends import DEFAULT_BACKEND, load_backend
+    from batcher import DynamicBatcher
+
+    # Backend is picked with MOODMIRROR_BACKEND (keras, tflite-float16, tflite-int8, onnx).
+    # ⚡ Every backend is warmed up on load; Keras reuses its serialized graph (fer2_savedmodel/) after the first run
+    with metrics.timer("load_model"):
+        backend = load_backend(DEFAULT_BACKEND, "fer2.h5", jit_compile=os.environ.get("MOODMIRROR_XLA") == "1")
+    # One batcher for the whole process: faces from every session and stream share forward passes
+    return DynamicBatcher(
+        backend,
+        max_batch=int(os.environ.get("MOODMIRROR_MAX_BATCH", 16)),
+        max_wait_ms=float(os.environ.get("MOODMIRROR_MAX_WAIT_MS", 4))
+    )
+
 @st.cache_resource
+def model_loader():
+    # Created by the first script run after the server starts; loading begins immediately in the background
+    return BackgroundLoader(_load_engine)
+
 def load_model():
-    import tensorflow as tf
-    model = tf.keras.Sequential([
-        tf.keras.layers.Input(shape=(48, 48, 1)),
-
-        tf.keras.layers.Conv2D(32, (3, 3), padding="same", activation="relu"),
-        tf.keras.layers.Conv2D(64, (3, 3), padding="same", activation="relu"),
-        tf.keras.layers.BatchNormalization(),
-        tf.keras.layers.MaxPooling2D(pool_size=(2, 2)),
-        tf.keras.layers.Dropout(0.25),
-
-        tf.keras.layers.Conv2D(
-            128, (3, 3),
-            padding="same",
-            activation="relu",
-            kernel_regularizer=tf.keras.regularizers.L2(0.01)
-        ),
-        tf.keras.layers.Conv2D(
-            256, (3, 3),
-            padding="valid",
-            activation="relu",
-            kernel_regularizer=tf.keras.regularizers.L2(0.01)
-        ),
-        tf.keras.layers.BatchNormalization(),
-        tf.keras.layers.MaxPooling2D(pool_size=(2, 2)),
-        tf.keras.layers.Dropout(0.25),
-
-        tf.keras.layers.Flatten(),
-        tf.keras.layers.Dense(1024, activation="relu"),
-        tf.keras.layers.Dropout(0.5),
-        tf.keras.layers.Dense(7, activation="softmax")
-    ])
-
-    model.build((None, 48, 48, 1))
-    model.load_weights("fer2.h5")
-    
-    # ⚡ WARM UP THE ENGINE
-    import numpy as np
-    model(np.zeros((1, 48, 48, 1), dtype=np.float32), training=False)
-    
+    loader = model_loader()
+    try:
+        model = loader.get()
+    except Exception:
+        # A failed load is reported once and not cached: the next rerun starts a fresh one
+        model_loader.clear()
+        raise
+    if not getattr(loader, "recorded", False):
+        loader.recorded = True
+        metrics.observe("startup.model_ready", loader.ready_ms)
     return model
 
+model_loader()
+
 @st.cache_data
 def load_labels():
     with open("class_labels.json", "r") as f:
@@ -466,16 +484,78 @@ def load_face_detector():
 
 
 # =========================
-# Session State
+# Upload Result Cache
+# =========================
+@st.cache_resource
+def load_result_cache():
+    # Shared by all sessions; keyed by upload content + backend + detector settings
+    return ResultCache(
+        max_entries=int(os.environ.get("MOODMIRROR_RESULT_CACHE_ENTRIES", 256)),
+        max_bytes=int(os.environ.get("MOODMIRROR_RESULT_CACHE_MB", 64)) * 2**20
+    )
+
+result_cache = load_result_cache()
+
+def encode_preview(image, max_width):
+    # Display-sized JPEG of an annotated BGR image; much smaller to keep than the decoded frame
+    import cv2
+    if image.shape[1] > max_width:
+        scale = max_width / image.shape[1]
+        image = cv2.resize(image, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+
+# =========================
+# Persistent Detection Log
 # =========================
-if "emotion_history" not in st.session_state:
-    st.session_state.emotion_history = []
+@st.cache_resource
+def load_store():
+    # Shared by every session; MOODMIRROR_DB="" keeps history in memory only
+    path = os.environ.get("MOODMIRROR_DB", "moodmirror.db")
+    return DetectionStore(path) if path else None
 
-if "confidence_history" not in st.session_state:
-    st.session_state.confidence_history = []
 
-if "timestamps" not in st.session_state:
-    st.session_state.timestamps = []
+# =========================
+# Session State
+# =========================
+# The session key lives in the URL so a browser reload finds its stored detections again
+if "session_id" not in st.session_state:
+    st.session_state.session_id = st.query_params.get("sid") or uuid.uuid4().hex[:12]
+st.query_params["sid"] = st.session_state.session_id
+
+# Fixed-size columnar history (epoch ms, label index, confidence, track ID); older rows get downsampled
+if "history" not in st.session_state:
+    st.session_state.history = DetectionHistory(store=load_store(), session=st.session_state.session_id)
+
+# Live detections arrive here from the stream thread; only the script thread drains them
+if "events" not in st.session_state:
+    st.session_state.events = EventChannel()
+    st.session_state.last_toast_time = 0
+    st.session_state.last_toast_emotion = ""
+
+# Content keys of uploads already written to history, so reruns never duplicate rows
+if "recorded_uploads" not in st.session_state:
+    st.session_state.recorded_uploads = set()
+
+
+def drain_events():
+    rows = st.session_state.events.drain()
+    if len(rows) == 0:
+        return
+    st.session_state.history.extend(rows)
+
+    # Toast when the dominant emotion changes, at most every 4 seconds
+    emotion_text = {v: k.capitalize() for k, v in load_labels().items()}[int(rows["label"][-1])]
+    current_time = time.time()
+    if current_time - st.session_state.last_toast_time > 4.0 and emotion_text != st.session_state.last_toast_emotion:
+        emojis = {"Happy": "😊", "Sad": "😢", "Angry": "😠", "Surprise": "😲", "Neutral": "😐", "Fear": "😨", "Disgust": "🤢"}
+        st.toast(f"Dominant Emotion Shift: **{emotion_text}** {emojis.get(emotion_text, '')}", icon="🌟")
+        st.session_state.last_toast_time = current_time
+        st.session_state.last_toast_emotion = emotion_text
+
+
+drain_events()
+metrics.sample_memory(st.session_state.session_id)
 # =========================
 # Deferred Loading Strategy Applied 🚀
 # =========================
@@ -490,7 +570,7 @@ if "current_page" not in st.session_state:
 st.markdown("<div style='margin-bottom: -15px;'></div>", unsafe_allow_html=True)
 page = st.radio(
     "",
-    options=["Home", "Live Detection", "Dashboard", "About"],
+    options=["Home", "Live Detection", "Dashboard", "Performance", "About"],
     key="current_page",
     horizontal=True,
     label_visibility="collapsed"
@@ -588,11 +668,30 @@ if page == "Home":
 # Live Detection Page
 # =========================
 elif page == "Live Detection":
-    # Defer loading to drastically speed up Home and Dashboard navigation times
+    # Heavy modules load only here; the model itself has been warming up in the background since boot
     with st.spinner("Initializing Local Engine..."):
+        import cv2
+        from streamlit_webrtc import webrtc_streamer, VideoTransformerBase, WebRtcMode
+        from engine import DETECT_PRESET, LIVE_DETECT, UPLOAD_DETECT, analyze_images, decode_and_detect, detect_preset, preset_kwargs
+        from live import LivePipeline
+        from motion import CropGate, MotionGate
+        from roi import RoiSearch
+        from overlay import draw_predictions
+        from scheduler import AdaptiveScheduler
+        from tracker import FaceTracker
         model = load_model()
         class_labels = load_labels()
         face_cascade = load_face_detector()
+
+        # MOODMIRROR_DETECT_PRESET=fast|balanced|accurate (tuned by Backend/detect_sweep.py) replaces the
+        # built-in Haar settings; the live scheduler keeps adapting the downscale on top of it
+        if DETECT_PRESET:
+            preset = detect_preset(DETECT_PRESET)
+            upload_detect = preset_kwargs(preset)
+            live_detect = {k: preset[k] for k in ("scaleFactor", "minNeighbors")}
+            live_min_face = preset["min_face"]
+        else:
+            upload_detect, live_detect, live_min_face = UPLOAD_DETECT, LIVE_DETECT, 60
     
     emotion_dict = {v: k.capitalize() for k, v in class_labels.items()}
 
@@ -614,12 +713,16 @@ elif page == "Live Detection":
         if "input_type" not in st.session_state:
             st.session_state.input_type = None
             
-        col_btn1, col_btn2 = st.columns(2)
+        col_btn1, col_btn2, col_btn3 = st.columns(3)
         with col_btn1:
             if st.button("Upload Image", use_container_width=True):
                 st.session_state.input_type = "Upload Image"
                 st.rerun()
         with col_btn2:
+            if st.button("Batch Upload", use_container_width=True):
+                st.session_state.input_type = "Batch Upload"
+                st.rerun()
+        with col_btn3:
             if st.button("Use Live Webcam", use_container_width=True):
                 st.session_state.input_type = "Use Live Webcam"
                 st.rerun()
@@ -632,31 +735,52 @@ elif page == "Live Detection":
 
         if option == "Upload Image":
             uploaded_file = st.file_uploader("Upload a high-quality human face image", type=["jpg", "jpeg", "png"])
+            crowd = st.checkbox("Crowd mode", help="Full-resolution, multi-core detection for group and classroom photos with many small faces")
             
             if uploaded_file is not None:
-                file_bytes = np.asarray(bytearray(uploaded_file.read()), dtype=np.uint8)
-                image = cv2.imdecode(file_bytes, 1)
-                
-                if image is not None:
-                    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-                    faces = face_cascade.detectMultiScale(
-                        gray, scaleFactor=1.1, minNeighbors=6, minSize=(80, 80)
-                    )
+                sid = st.session_state.session_id
+                data = uploaded_file.getvalue()
+                # Reruns (any widget click) with the same file reuse the stored result instead of re-running inference
+                record_key = content_key(data, model.name, upload_detect, crowd)
+                upload_key = scoped_key(record_key, "single", 700)
+                result = result_cache.get(upload_key)
+
+                if result is None:
+                    # Big photos are searched at reduced resolution and cropped from a finer decode;
+                    # boxes come back in full-resolution pixels, `image` is decoded at about preview size
+                    with metrics.timer("upload.decode_detect", sid):
+                        boxes, face_batch, image, scale = decode_and_detect(
+                            data, face_cascade, upload_detect, display_side=700, crowd=crowd
+                        )
+
+                    if image is not None:
+                        # All faces go into one uint8 batch and through the model in a single call
+                        with metrics.timer("upload.classify", sid):
+                            predictions = model(face_batch.faces, training=False) if boxes else []
+
+                        # Draw bounding boxes on image
+                        for (x, y, w, h) in boxes:
+                            x, y, w, h = (int(v * scale) for v in (x, y, w, h))
+                            cv2.rectangle(image, (x, y), (x+w, y+h), (255, 255, 255), 2)
+
+                        result = {"boxes": boxes, "probs": np.asarray(predictions), "preview": encode_preview(image, 700)}
+                        result_cache.put(upload_key, result, len(result["preview"]) + result["probs"].nbytes)
+                else:
+                    metrics.inc("upload_cache_hits", session=sid)
 
-                    if len(faces) == 0:
+                if result is not None:
+                    if len(result["boxes"]) == 0:
                         st.warning("⚠️ No face detected in the image. Please try again with a clear face.")
                     else:
+                        # History gets each unique image once per session
+                        record = record_key not in st.session_state.recorded_uploads
+                        st.session_state.recorded_uploads.add(record_key)
+
                         emotion_window = deque(maxlen=10)
                         main_emotion_text = "Neutral"
                         main_confidence = 0.0
 
-                        for (x, y, w, h) in faces:
-                            face = gray[y:y+h, x:x+w]
-                            face = cv2.resize(face, (48, 48))
-                            face = face.astype("float32") / 255.0
-                            face = np.reshape(face, (1, 48, 48, 1))
-
-                            prediction = model(face, training=False).numpy()
+                        for prediction in result["probs"]:
                             emotion_index = int(np.argmax(prediction))
                             confidence = float(np.max(prediction) * 100)
 
@@ -664,12 +788,8 @@ elif page == "Live Detection":
                             smooth_emotion_index = max(set(emotion_window), key=emotion_window.count)
                             emotion_text = emotion_dict[smooth_emotion_index]
 
-                            st.session_state.emotion_history.append(emotion_text)
-                            st.session_state.confidence_history.append(confidence)
-                            st.session_state.timestamps.append(datetime.now().strftime("%H:%M:%S"))
-
-                            # Draw bounding box on image
-                            cv2.rectangle(image, (x, y), (x+w, y+h), (255, 255, 255), 2)
+                            if record:
+                                st.session_state.history.append(smooth_emotion_index, confidence)
                             
                             if main_confidence == 0.0:
                                 main_emotion_text = emotion_text
@@ -708,168 +828,156 @@ elif page == "Live Detection":
 
                         with preview_col2:
                              st.image(
-                                   cv2.cvtColor(image, cv2.COLOR_BGR2RGB),
+                                   result["preview"],
                               caption="Neural Network Analysis",
                                width=350
                                        )
                         st.markdown("</div>", unsafe_allow_html=True)
 
+        elif option == "Batch Upload":
+            uploaded_files = st.file_uploader(
+                "Upload a folder's worth of face images", type=["jpg", "jpeg", "png"], accept_multiple_files=True
+            )
+            crowd = st.checkbox("Crowd mode", help="Full-resolution, multi-core detection for group and classroom photos with many small faces")
+
+            if uploaded_files:
+                # Only images not seen before (by content) go through detection and the model
+                blobs = [f.getvalue() for f in uploaded_files]
+                record_keys = [content_key(data, model.name, upload_detect, crowd) for data in blobs]
+                keys = [scoped_key(key, "batch", 480) for key in record_keys]
+                cached = [result_cache.get(key) for key in keys]
+                misses = [i for i, result in enumerate(cached) if result is None]
+                if misses:
+                    with st.spinner(f"Analyzing {len(misses)} images..."), \
+                            metrics.timer("batch.analyze", st.session_state.session_id):
+                        # One decode/detect pass per image in parallel, one model call per batch of faces
+                        analyzed = analyze_images(model, [blobs[i] for i in misses], detect_kwargs=upload_detect,
+                                                  display_side=480, crowd=crowd)
+
+                    for i, result in zip(misses, analyzed):
+                        image = result["image"]
+                        if image is not None:
+                            for box, prob in result["faces"]:
+                                x, y, w, h = (int(v * result["scale"]) for v in box)
+                                emotion_index = int(np.argmax(prob))
+                                cv2.rectangle(image, (x, y), (x+w, y+h), (255, 255, 255), 2)
+                                cv2.putText(image, f"{emotion_dict[emotion_index]} {float(np.max(prob) * 100):.0f}%",
+                                            (x, max(0, y - 8)), cv2.FONT_HERSHEY_DUPLEX, 0.6, (255, 255, 255), 1, cv2.LINE_AA)
+                        cached[i] = {
+                            "faces": result["faces"],
+                            "preview": encode_preview(image, 480) if image is not None else None
+                        }
+                        nbytes = len(cached[i]["preview"] or b"") + sum(prob.nbytes for _, prob in result["faces"])
+                        result_cache.put(keys[i], cached[i], nbytes)
+
+                rows = []
+                annotated = []
+                now = now_ms()
+                for uploaded, key, result in zip(uploaded_files, record_keys, cached):
+                    if result["preview"] is None:
+                        rows.append({"File": uploaded.name, "Faces": 0, "Primary Emotion": "Unreadable", "Confidence": 0.0})
+                        continue
+
+                    # History gets each unique image once per session
+                    record = key not in st.session_state.recorded_uploads
+                    st.session_state.recorded_uploads.add(key)
+
+                    main_emotion_text = "No face"
+                    main_confidence = 0.0
+                    for _, prob in result["faces"]:
+                        emotion_index = int(np.argmax(prob))
+                        confidence = float(np.max(prob) * 100)
+                        emotion_text = emotion_dict[emotion_index]
+
+                        if record:
+                            st.session_state.history.append(emotion_index, confidence, ts_ms=now)
+
+                        if main_confidence == 0.0:
+                            main_emotion_text = emotion_text
+                            main_confidence = confidence
+
+                    rows.append({
+                        "File": uploaded.name,
+                        "Faces": len(result["faces"]),
+                        "Primary Emotion": main_emotion_text,
+                        "Confidence": round(main_confidence, 1)
+                    })
+                    annotated.append((uploaded.name, result["preview"]))
+
+                total_faces = sum(row["Faces"] for row in rows)
+                st.markdown(
+                    f"<div class='metric-box'><h3>{total_faces}</h3><p>Faces across {len(rows)} images</p></div>",
+                    unsafe_allow_html=True
+                )
+                st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+
+                grid = st.columns(4)
+                for i, (name, image) in enumerate(annotated):
+                    with grid[i % 4]:
+                        st.image(image, caption=name, use_container_width=True)
+
         elif option == "Use Live Webcam":
             st.toast("Warming up WebCamera... Please allow a few seconds to connect.", icon="⏳")
             st.info("💡 Grant browser camera permissions to activate real-time detection.")
             
-            # Keep references to the session state lists so the thread can append to them
-            em_hist = st.session_state.emotion_history
-            conf_hist = st.session_state.confidence_history
-            time_hist = st.session_state.timestamps
-            
-            from streamlit.runtime.scriptrunner import get_script_run_ctx
-            ctx = get_script_run_ctx()
+            # The stream thread only pushes compact records; the script drains them into history
+            events = st.session_state.events
+            sid = st.session_state.session_id
 
             class EmotionProcessor(VideoTransformerBase):
                 def __init__(self):
                     self.frame_count = 0
-                    self.emotion_window = deque(maxlen=5) # Kept for primary face
+                    # Detection and classification run on worker threads; transform only draws
+                    self.pipeline = LivePipeline(
+                        model, face_cascade, emotion_dict,
+                        scheduler=AdaptiveScheduler(target_fps=15, min_face=live_min_face), # Adapts cadence/downscale to measured cost
+                        tracker=FaceTracker(window=5), # Stable IDs + per-face smoothing
+                        on_primary=self.on_primary,
+                        detect_kwargs=live_detect,
+                        metrics=metrics,
+                        session=sid,
+                        motion=MotionGate(max_static_ms=2000), # Skips the cascade while the scene is static
+                        crop_gate=CropGate(max_age_ms=1500), # Reuses a face's emotion while its crop is unchanged
+                        roi=RoiSearch(full_every_ms=1000) # Searches near known faces, whole frame once a second
+                    )
+                    self.scheduler = self.pipeline.scheduler
                     self.last_predictions = [] # Support multiple faces
-                    self.ctx = ctx
-                    self.last_toast_time = 0
-                    self.last_toast_emotion = ""
-                    self.em_hist = em_hist
-                    self.conf_hist = conf_hist
-                    self.time_hist = time_hist
+                    self.last_event_time = 0
+                    self.events = events
+
+                def on_primary(self, emotion_index, confidence, track_id):
+                    # Called from the classification thread with the largest face's smoothed emotion;
+                    # record it roughly every second
+                    current_time = time.time()
+                    if current_time - self.last_event_time >= 1.0:
+                        self.events.push(int(current_time * 1000), emotion_index, confidence, track_id)
+                        self.last_event_time = current_time
 
                 def transform(self, frame):
+                    frame_start = time.perf_counter()
                     img = frame.to_ndarray(format="bgr24")
                     self.frame_count += 1
 
-                    # Frame Skipping: Optmized processing every 3rd frame
-                    if self.frame_count % 3 == 0:
-                        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-                        # Downscale for much faster face detection
-                        small_gray = cv2.resize(gray, (0, 0), fx=0.5, fy=0.5)
-                        faces = face_cascade.detectMultiScale(
-                            small_gray, scaleFactor=1.1, minNeighbors=4, minSize=(30, 30)
-                        )
-
-                        current_preds = []
-                        if len(faces) > 0:
-                            # Find the largest face by area for tracking the primary user
-                            areas = [w*h for (x,y,w,h) in faces]
-                            largest_idx = np.argmax(areas)
-                            
-                            face_imgs = []
-                            face_boxes = []
-                            # Process all faces
-                            for idx, (x, y, w, h) in enumerate(faces):
-                                x, y, w, h = x*2, y*2, w*2, h*2 # Scale matching back to original size
-                                
-                                # Extract and preprocess face
-                                face_img = gray[y:y+h, x:x+w]
-                                if face_img.size == 0:
-                                    continue
-                                face_img = cv2.resize(face_img, (48, 48))
-                                face_img = face_img.astype("float32") / 255.0
-                                face_img = np.reshape(face_img, (48, 48, 1))
-                                
-                                face_imgs.append(face_img)
-                                face_boxes.append((x, y, w, h))
-
-                            if face_imgs:
-                                face_batch = np.array(face_imgs)
-                                predictions = model(face_batch, training=False).numpy()
-                                
-                                for i, pred in enumerate(predictions):
-                                    emotion_index = int(np.argmax(pred))
-                                    confidence = float(np.max(pred) * 100)
-                                    emotion_text = emotion_dict[emotion_index]
-                                    
-                                    if i == largest_idx:
-                                        self.emotion_window.append(emotion_index)
-                                        smooth_emotion_index = max(set(self.emotion_window), key=self.emotion_window.count)
-                                        emotion_text = emotion_dict[smooth_emotion_index]
-                                        
-                                        # Active Popup System asynchronously
-                                        import time
-                                        current_time = time.time()
-                                        if current_time - getattr(self, 'last_toast_time', 0) > 4.0:
-                                            if emotion_text != getattr(self, 'last_toast_emotion', "") and emotion_text != "Detecting...":
-                                                try:
-                                                    import threading
-                                                    from streamlit.runtime.scriptrunner import add_script_run_ctx
-                                                    add_script_run_ctx(threading.current_thread(), self.ctx)
-                                                    emojis = {"Happy": "😊", "Sad": "😢", "Angry": "😠", "Surprise": "😲", "Neutral": "😐", "Fear": "😨", "Disgust": "🤢"}
-                                                    st.toast(f"Dominant Emotion Shift: **{emotion_text}** {emojis.get(emotion_text, '')}", icon="🌟")
-                                                    self.last_toast_time = current_time
-                                                    self.last_toast_emotion = emotion_text
-                                                except Exception:
-                                                    pass
-                                        
-                                        # Add to analytics history roughly every second (assuming 30 FPS)
-                                        if self.frame_count % 30 == 0:
-                                            self.em_hist.append(emotion_text)
-                                            self.conf_hist.append(confidence)
-                                            self.time_hist.append(datetime.now().strftime("%H:%M:%S"))
-                                            
-                                    current_preds.append((emotion_text, confidence, face_boxes[i]))
-                        else:
-                            current_preds = [("Detecting...", 0.0, None)]
-                            
-                        self.last_predictions = current_preds
-
-                    # Overlays
-                    for pred in self.last_predictions:
-                        emotion_text, confidence, face_coords = pred
-
-                        if face_coords is not None:
-                            (x, y, w, h) = face_coords
-                            
-                            # Make the bounding box slightly broader around the face
-                            pad_x = int(w * 0.15)
-                            pad_y = int(h * 0.15)
-                            x = max(0, x - pad_x)
-                            y = max(0, y - pad_y)
-                            w = w + (pad_x * 2)
-                            h = h + (pad_y * 2)
-
-                            # Futuristic Bounding Box Styling
-                            colors = {
-                                "Happy": (81, 185, 16), "Sad": (235, 99, 37),
-                                "Angry": (38, 38, 220), "Surprise": (11, 158, 245),
-                                "Neutral": (139, 116, 100), "Fear": (237, 58, 124),
-                                "Disgust": (22, 204, 132), "Detecting...": (150, 150, 150)
-                            }
-                            color = colors.get(emotion_text, (255, 255, 255))
-                            thickness = 4
-                            length = 30
-
-                            # Thicker Full Box
-                            cv2.rectangle(img, (x, y), (x+w, y+h), color, 3)
-
-                            # Glowing Corners
-                            cv2.line(img, (x, y), (x + length, y), color, thickness)
-                            cv2.line(img, (x, y), (x, y + length), color, thickness)
-                            cv2.line(img, (x+w, y), (x+w - length, y), color, thickness)
-                            cv2.line(img, (x+w, y), (x+w, y + length), color, thickness)
-                            cv2.line(img, (x, y+h), (x + length, y+h), color, thickness)
-                            cv2.line(img, (x, y+h), (x, y+h - length), color, thickness)
-                            cv2.line(img, (x+w, y+h), (x+w - length, y+h), color, thickness)
-                            cv2.line(img, (x+w, y+h), (x+w, y+h - length), color, thickness)
-
-                            # Dynamic Overlay Plate
-                            label = f"{emotion_text} | {confidence:.1f}%"
-                            (tw, th), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_DUPLEX, 0.6, 1)
-                            
-                            # Background label plate
-                            cv2.rectangle(img, (x, y - th - 12), (x + tw + 10, y), color, -1)
-                            # Text
-                            cv2.putText(img, label, (x + 5, y - 5), cv2.FONT_HERSHEY_DUPLEX, 0.6, (255, 255, 255), 1, cv2.LINE_AA)
-
+                    # Hand the frame to the workers (latest frame wins) and draw whatever results are newest
+                    self.pipeline.submit(img)
+                    draw_start = time.perf_counter()
+                    self.last_predictions = self.pipeline.predictions()
+                    draw_predictions(img, self.last_predictions)
+
+                    frame_end = time.perf_counter()
+                    frame_ms = (frame_end - frame_start) * 1000.0
+                    self.scheduler.record_frame(frame_ms)
+                    metrics.observe("live.overlay", (frame_end - draw_start) * 1000.0, sid)
+                    metrics.observe("live.frame", frame_ms, sid)
                     return img
 
+                def on_ended(self):
+                    self.pipeline.close()
+
             # WebRTC Component
             _, cam_col, _ = st.columns([1, 4, 1])
             with cam_col:
-                webrtc_streamer(
+                webrtc_ctx = webrtc_streamer(
                     key="moodmirror-live",
                     mode=WebRtcMode.SENDRECV,
                     video_transformer_factory=EmotionProcessor,
@@ -892,6 +1000,28 @@ elif page == "Live Detection":
                     },
                 )
             
+            # Drain detections (and raise toasts) once a second while the stream runs,
+            # alongside the current adaptive settings for this stream
+            @st.fragment(run_every=1.0 if webrtc_ctx.state.playing else None)
+            def stream_status():
+                drain_events()
+                metrics.sample_memory(sid)
+                if webrtc_ctx.video_transformer is not None:
+                    stats = webrtc_ctx.video_transformer.pipeline.stats()
+                    skip_col, reuse_col, scan_col = st.columns(3)
+                    skip_col.metric("Detections Skipped", f"{stats.get('motion_skip_ratio', 0.0):.0%}")
+                    reuse_col.metric("Classifications Reused", f"{stats.get('crop_reuse_ratio', 0.0):.0%}")
+                    scan_col.metric("Pixels Scanned", f"{stats.get('pixels_scanned', 0):,}",
+                                    f"{stats.get('scan_pixel_ratio', 1.0):.0%} of full frames", delta_color="off")
+                    with st.expander("Stream Settings"):
+                        st.json({
+                            **stats,
+                            "dropped_events": events.dropped,
+                            "shared_batcher": model.stats()
+                        })
+
+            stream_status()
+
             st.markdown("<div style='margin-top: 20px;'>", unsafe_allow_html=True)
             _, stop_col, _ = st.columns([1, 2, 1])
             with stop_col:
@@ -909,20 +1039,32 @@ elif page == "Live Detection":
 elif page == "Dashboard":
     st.markdown("<div class='subtitle-text'><b>MoodMirror</b> | Emotion Analytics Dashboard</div>", unsafe_allow_html=True)
 
-    if len(st.session_state.emotion_history) == 0:
+    history = st.session_state.history
+    # Running aggregates cover the whole session; other windows are aggregated by the persistent log
+    stats, buckets = history.aggregates()
+    start_ms = None
+    if history.store is not None:
+        # Everything below reads the log, so queued rows are written first
+        history.store.flush()
+        ranges = {"Whole session": None, "Last 5 minutes": 5 * 60_000, "Last hour": 3_600_000, "Last 24 hours": 86_400_000}
+        window = st.selectbox("Time range", list(ranges))
+        if ranges[window]:
+            start_ms = now_ms() - ranges[window]
+            counts, conf_sum = history.store.label_totals(history.session, start_ms=start_ms)
+            stats = {**stats, "counts": counts, "mean_confidence": conf_sum / counts.sum() if counts.sum() else 0.0}
+            buckets = history.store.buckets(history.session, start_ms=start_ms)
+
+    total_scans = int(stats["counts"].sum())
+    if total_scans == 0:
         st.info("No emotion data available yet. Please detect emotions first.")
     else:
-        df = pd.DataFrame({
-            "Time": st.session_state.timestamps,
-            "Emotion": st.session_state.emotion_history,
-            "Confidence": st.session_state.confidence_history
-        })
-
-        total_scans = len(df)
-        top_emotion = df["Emotion"].mode()[0]
-        avg_conf = round(df["Confidence"].mean(), 2)
+        label_names = {v: k.capitalize() for k, v in load_labels().items()}
+        local_tz = datetime.now().astimezone().tzinfo
+        top_emotion = label_names[int(stats["counts"].argmax())]
+        avg_conf = round(stats["mean_confidence"], 2)
+        recent_conf = f"{stats['window_mean_confidence']:.2f}%" if stats["window_total"] else "—"
 
-        c1, c2, c3 = st.columns(3)
+        c1, c2, c3, c4 = st.columns(4)
         with c1:
             st.markdown(
                 f"<div class='metric-box'><h3>{total_scans}</h3><p>Total Detections</p></div>",
@@ -938,11 +1080,19 @@ elif page == "Dashboard":
                 f"<div class='metric-box'><h3>{avg_conf}%</h3><p>Average Confidence</p></div>",
                 unsafe_allow_html=True
             )
+        with c4:
+            st.markdown(
+                f"<div class='metric-box'><h3>{recent_conf}</h3><p>Last Minute ({stats['window_total']} scans)</p></div>",
+                unsafe_allow_html=True
+            )
 
         st.markdown("<div style='height: 30px;'></div>", unsafe_allow_html=True)
 
-        emotion_counts = df["Emotion"].value_counts().reset_index()
-        emotion_counts.columns = ["Emotion", "Count"]
+        emotion_counts = pd.DataFrame({
+            "Emotion": [label_names[i] for i in range(len(stats["counts"]))],
+            "Count": stats["counts"]
+        })
+        emotion_counts = emotion_counts[emotion_counts["Count"] > 0]
 
         # Premium Bar Chart
         bar_chart = alt.Chart(emotion_counts).mark_bar(
@@ -965,36 +1115,126 @@ elif page == "Dashboard":
         st.altair_chart(bar_chart, use_container_width=True)
         st.markdown("</div>", unsafe_allow_html=True)
 
-        # Premium Line Chart
-        line_chart = alt.Chart(df).mark_line(
-            point=alt.OverlayMarkDef(color="#38bdf8", size=60),
-            color="#8b5cf6",
-            strokeWidth=3,
-            tension=0.4 # smooth interpolation
-        ).encode(
-            x=alt.X("Time:N", axis=alt.Axis(labelColor='#94a3b8', titleColor='#94a3b8')),
-            y=alt.Y("Confidence:Q", scale=alt.Scale(domain=[0, 100]), axis=alt.Axis(labelColor='#94a3b8', titleColor='#94a3b8')),
+        # Premium Line Chart: one point per time bucket, so its size is fixed however long the session runs
+        trend = pd.DataFrame({
+            "Time": pd.to_datetime(buckets["ts_ms"], unit="ms", utc=True).tz_convert(local_tz),
+            "Emotion": pd.Series(buckets["label"]).map(label_names),
+            "Min": buckets["min"].round(2),
+            "Confidence": buckets["mean"].round(2),
+            "Max": buckets["max"].round(2),
+            "Scans": buckets["count"]
+        })
+        base = alt.Chart(trend).encode(
+            x=alt.X("Time:T", axis=alt.Axis(labelColor='#94a3b8', titleColor='#94a3b8'))
+        )
+        band = base.mark_area(color="#8b5cf6", opacity=0.15).encode(
+            y=alt.Y("Min:Q", scale=alt.Scale(domain=[0, 100]), title="Confidence"),
+            y2="Max:Q"
+        )
+        line = base.mark_line(color="#8b5cf6", strokeWidth=3, tension=0.4).encode(y="Confidence:Q")
+        points = base.mark_point(filled=True, size=60).encode(
+            y=alt.Y("Confidence:Q", axis=alt.Axis(labelColor='#94a3b8', titleColor='#94a3b8')),
             color=alt.Color("Emotion:N", legend=alt.Legend(labelColor='#94a3b8', titleColor='#94a3b8')),
-            tooltip=["Time", "Emotion", "Confidence"]
-        ).properties(height=350).configure_view(strokeWidth=0).configure_axis(gridColor='rgba(255,255,255,0.05)', domain=False)
+            tooltip=["Time", "Emotion", "Min", "Confidence", "Max", "Scans"]
+        )
+        line_chart = (band + line + points).properties(height=350).configure_view(strokeWidth=0).configure_axis(
+            gridColor='rgba(255,255,255,0.05)', domain=False
+        )
 
         st.markdown("<div class='card'>", unsafe_allow_html=True)
         st.subheader("Confidence Trend Over Time")
         st.altair_chart(line_chart, use_container_width=True)
         st.markdown("</div>", unsafe_allow_html=True)
 
+        # Only the visible page of the log is fetched and rendered
         st.markdown("<div class='card'>", unsafe_allow_html=True)
         st.subheader("Detailed Detection Logs")
+        page_size = 50
+        if history.store is not None:
+            log_total = history.store.count(history.session, start_ms=start_ms)
+        else:
+            log_rows = history.snapshot()[::-1]
+            log_total = len(log_rows)
+        num_pages = max(1, -(-log_total // page_size))
+        log_page = st.number_input(f"Page (of {num_pages})", min_value=1, max_value=num_pages, value=1, step=1)
+        offset = (log_page - 1) * page_size
+        if history.store is not None:
+            rows = history.store.page(history.session, start_ms=start_ms, offset=offset, limit=page_size)
+        else:
+            rows = log_rows[offset:offset + page_size]
+        df = pd.DataFrame({
+            "Time": pd.to_datetime(rows["ts_ms"], unit="ms", utc=True).tz_convert(local_tz),
+            "Emotion": pd.Series(rows["label"]).map(label_names),
+            "Confidence": rows["confidence"].round(2),
+            "Track": rows["track"]
+        })
         st.dataframe(df, use_container_width=True, hide_index=True)
         st.markdown("</div>", unsafe_allow_html=True)
 
         if st.button("Clear Dashboard Data"):
-            st.session_state.emotion_history = []
-            st.session_state.confidence_history = []
-            st.session_state.timestamps = []
+            st.session_state.history.clear()
             st.success("Dashboard data cleared successfully.")
             st.rerun()
 
+# =========================
+# Performance Page
+# =========================
+elif page == "Performance":
+    st.markdown("<div class='subtitle-text'><b>MoodMirror</b> | Pipeline Performance</div>", unsafe_allow_html=True)
+
+    sessions = metrics.sessions()
+    scope = st.selectbox(
+        "Scope", ["All sessions"] + sessions,
+        format_func=lambda s: f"{s} (this session)" if s == st.session_state.session_id else s
+    )
+    session = None if scope == "All sessions" else scope
+
+    counters = metrics.counter_totals(session)
+    memory = metrics.latest_memory()
+    rss_mb = max((m["rss_bytes"] for m in memory.values()), default=0) / 2**20
+    frames = sum(h["count"] for h in metrics.stage_summary(session) if h["stage"] == "live.frame")
+    dropped = counters.get("live_frames_dropped", 0) + counters.get("live_detections_dropped", 0)
+
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        st.markdown(f"<div class='metric-box'><h3>{frames}</h3><p>Live Frames</p></div>", unsafe_allow_html=True)
+    with c2:
+        st.markdown(f"<div class='metric-box'><h3>{dropped}</h3><p>Dropped Handoffs</p></div>", unsafe_allow_html=True)
+    with c3:
+        st.markdown(f"<div class='metric-box'><h3>{rss_mb:.0f} MB</h3><p>Process RSS</p></div>", unsafe_allow_html=True)
+
+    st.markdown("<div class='card'>", unsafe_allow_html=True)
+    st.subheader("Stage Latency")
+    stages = metrics.stage_summary(session)
+    if stages:
+        st.dataframe(pd.DataFrame(stages), use_container_width=True, hide_index=True)
+    else:
+        st.info("No timings recorded yet. Run an upload or a live stream first.")
+    st.markdown("</div>", unsafe_allow_html=True)
+
+    st.markdown("<div class='card'>", unsafe_allow_html=True)
+    st.subheader("Memory by Session")
+    st.dataframe(pd.DataFrame([
+        {
+            "Session": s,
+            "Sampled": datetime.fromtimestamp(m["ts"]).strftime("%H:%M:%S"),
+            "RSS (MB)": round(m["rss_bytes"] / 2**20, 1),
+            "Traced Heap (MB)": round(m["traced_bytes"] / 2**20, 2),
+            "Traced Peak (MB)": round(m["traced_peak_bytes"] / 2**20, 2)
+        }
+        for s, m in sorted(memory.items()) if session is None or s == session
+    ]), use_container_width=True, hide_index=True)
+    if not any(m["traced_bytes"] for m in memory.values()):
+        st.caption("Set MOODMIRROR_TRACEMALLOC=1 to trace the Python heap (adds allocation overhead).")
+    st.markdown("</div>", unsafe_allow_html=True)
+
+    with st.expander("Counters"):
+        st.json({**counters, "upload_cache": result_cache.stats()})
+
+    st.download_button(
+        "Export Prometheus Metrics", metrics.prometheus(), file_name="moodmirror.prom", mime="text/plain"
+    )
+
 # =========================
 # About Page
 # =========================
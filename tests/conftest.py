@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Backend modules import each other as top-level names
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Backend"))
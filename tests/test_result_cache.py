@@ -0,0 +1,21 @@
+from result_cache import ResultCache, content_key, scoped_key
+
+
+def test_pages_get_separate_slots_for_the_same_image():
+    # Upload Image and Batch Upload store different result shapes for the same bytes
+    record_key = content_key(b"same image", "keras", {"scaleFactor": 1.1}, False)
+    single = scoped_key(record_key, "single", 700)
+    batch = scoped_key(record_key, "batch", 480)
+    assert single != batch
+
+    cache = ResultCache()
+    cache.put(single, {"boxes": [], "probs": [], "preview": b""})
+    assert cache.get(batch) is None
+    cache.put(batch, {"faces": [], "preview": b""})
+    assert "boxes" in cache.get(single)
+    assert "faces" in cache.get(batch)
+
+
+def test_record_key_ignores_scope():
+    assert content_key(b"a", "keras") == content_key(b"a", "keras")
+    assert content_key(b"a", "keras") != content_key(b"a", "tflite-int8")